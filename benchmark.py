@@ -0,0 +1,440 @@
+import argparse
+import functools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+import degrees
+import util
+from graph import Graph, LANDMARK_COUNT, Landmarks, load_graph
+from nameindex import NameIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark degrees.py search on random pairs of people."
+    )
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    frontier = subparsers.add_parser(
+        "frontier", help="compare list-backed and deque-backed frontiers"
+    )
+    add_common_arguments(frontier)
+
+    bidirectional = subparsers.add_parser(
+        "bidirectional", help="compare single-direction and bidirectional BFS"
+    )
+    add_common_arguments(bidirectional)
+
+    backend = subparsers.add_parser(
+        "backend", help="compare memory use and speed of the dict and CSR backends"
+    )
+    add_common_arguments(backend)
+
+    snapshot = subparsers.add_parser(
+        "snapshot", help="compare startup from CSV files and from the snapshot"
+    )
+    snapshot.add_argument("directory", nargs="?", default="large")
+
+    ingest = subparsers.add_parser(
+        "ingest", help="measure time and peak memory of parsing the CSV files"
+    )
+    ingest.add_argument("directory", nargs="?", default="large")
+
+    parallel = subparsers.add_parser(
+        "parallel", help="measure batch throughput with more worker processes"
+    )
+    add_common_arguments(parallel)
+    parallel.add_argument("--backend", choices=degrees.BACKENDS, default="csr")
+    parallel.add_argument("--search", choices=degrees.SEARCHES, default="bfs")
+    parallel.add_argument("--workers", default="1,2,4,8",
+                          help="comma-separated worker counts")
+
+    astar = subparsers.add_parser(
+        "astar", help="compare people expanded by BFS and landmark A* search"
+    )
+    add_common_arguments(astar)
+    astar.add_argument("--landmarks", default=str(LANDMARK_COUNT),
+                       help="comma-separated landmark counts "
+                            f"(default: {LANDMARK_COUNT})")
+
+    lookups = subparsers.add_parser(
+        "names", help="time exact, prefix and fuzzy name lookups"
+    )
+    add_common_arguments(lookups)
+
+    args = parser.parse_args()
+
+    if args.benchmark == "backend":
+        benchmark_backends(args.directory, args.queries, args.seed)
+        return
+    if args.benchmark == "snapshot":
+        benchmark_snapshot(args.directory)
+        return
+    if args.benchmark == "ingest":
+        benchmark_ingest(args.directory)
+        return
+    if args.benchmark == "astar":
+        counts = [int(n) for n in args.landmarks.split(",")]
+        benchmark_astar(args.directory, counts, args.queries, args.seed)
+        return
+    if args.benchmark == "names":
+        benchmark_names(args.directory, args.queries, args.seed)
+        return
+    if args.benchmark == "parallel":
+        workers = [int(n) for n in args.workers.split(",")]
+        benchmark_parallel(args.directory, args.backend, args.search,
+                           workers, args.queries, args.seed)
+        return
+
+    print(f"Loading data from {args.directory}...")
+    start = time.perf_counter()
+    degrees.load_data(args.directory)
+    print(f"Data loaded in {time.perf_counter() - start:.2f}s.")
+
+    pairs = random_pairs(args.queries, args.seed)
+    if args.benchmark == "frontier":
+        benchmark_frontier(pairs)
+    elif args.benchmark == "bidirectional":
+        benchmark_searches(pairs, ["bfs", "bidirectional"])
+
+
+def add_common_arguments(parser):
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("-n", "--queries", type=int, default=20,
+                        help="number of random source/target pairs")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def random_pairs(n, seed):
+    """
+    Return `n` random (source, target) pairs of person ids.
+    """
+    rng = random.Random(seed)
+    person_ids = sorted(degrees.people)
+    return [
+        (rng.choice(person_ids), rng.choice(person_ids))
+        for _ in range(n)
+    ]
+
+
+def run_queries(search, pairs):
+    """
+    Run `search` on every pair, returning the path lengths
+    (None if not connected) and the elapsed time in seconds.
+    """
+    lengths = []
+    start = time.perf_counter()
+    for source, target in pairs:
+        path = search(source, target)
+        if path is not None and not valid_path(source, target, path):
+            raise ValueError(f"invalid path from {source} to {target}")
+        lengths.append(None if path is None else len(path))
+    return lengths, time.perf_counter() - start
+
+
+def valid_path(source, target, path):
+    """
+    Return True if every step of `path` is a movie both people starred in.
+    """
+    person_id = source
+    for movie_id, next_id in path:
+        stars = degrees.movies[movie_id]["stars"]
+        if person_id not in stars or next_id not in stars:
+            return False
+        person_id = next_id
+    return person_id == target
+
+
+def report(label, pairs, elapsed):
+    rate = len(pairs) / elapsed if elapsed else float("inf")
+    print(f"  {label:<24} {elapsed:8.3f}s  {rate:10.2f} queries/s")
+
+
+def benchmark_frontier(pairs):
+    print(f"Frontier benchmark ({len(pairs)} queries)")
+    results = {}
+    for label, frontier in [
+        ("list QueueFrontier", util.QueueFrontier),
+        ("deque QueueFrontier", util.DequeQueueFrontier),
+    ]:
+        degrees.QueueFrontier = frontier
+        results[label], elapsed = run_queries(degrees.shortest_path, pairs)
+        report(label, pairs, elapsed)
+    degrees.QueueFrontier = util.DequeQueueFrontier
+
+    check_lengths(results)
+
+
+def benchmark_searches(pairs, searches):
+    print(f"Search benchmark ({len(pairs)} queries)")
+    results = {}
+    for search in searches:
+        results[search], elapsed = run_queries(
+            degrees.search_function(search), pairs
+        )
+        report(search, pairs, elapsed)
+    check_lengths(results)
+
+
+def reset_degrees():
+    """
+    Forget everything `degrees.load_data` loaded, so it can load again.
+    The csr backend leaves read-only views in `people` and `movies`, so
+    fresh dictionaries replace them rather than clearing them.
+    """
+    degrees.names = {}
+    degrees.people = {}
+    degrees.movies = {}
+    degrees.graph = None
+    degrees.name_index = None
+    degrees.landmarks = None
+
+
+def benchmark_backends(directory, queries, seed):
+    print(f"Backend benchmark ({directory})")
+    print(f"  {'backend':<24} {'load':>9}  {'memory':>10}")
+
+    # Both backends load from the snapshot and build the name index.
+    # The dict backend loads last, so its dictionaries are the ones left
+    # for its searches
+    def load(backend):
+        reset_degrees()
+        degrees.load_data(directory, backend)
+        return degrees.graph
+
+    graph = measure_load("csr", lambda: load("csr"))
+    measure_load("dict", lambda: load("dict"))
+
+    pairs = random_pairs(queries, seed)
+    print(f"Search benchmark ({len(pairs)} queries)")
+    results = {}
+    for label, search in [
+        ("dict bfs", degrees.shortest_path),
+        ("csr bfs", graph.shortest_path),
+        ("dict bidirectional", degrees.bidirectional_shortest_path),
+        ("csr bidirectional", graph.bidirectional_shortest_path),
+    ]:
+        results[label], elapsed = run_queries(search, pairs)
+        report(label, pairs, elapsed)
+    check_lengths(results)
+
+
+def benchmark_astar(directory, landmark_counts, queries, seed):
+    print(f"Loading data from {directory}...")
+    degrees.load_data(directory)
+    graph = load_graph(directory)
+
+    # Disconnected pairs say little about search order, so only pick
+    # people connected to whoever starred in the most movies
+    offsets = graph.person_offsets
+    hub = max(
+        range(len(graph.person_ids)),
+        key=lambda i: offsets[i + 1] - offsets[i]
+    )
+    distances = graph.distances_from(graph.person_ids[hub]).distances
+    connected = [
+        person_id for person_id, distance in zip(graph.person_ids, distances)
+        if distance >= 0
+    ]
+    rng = random.Random(seed)
+    pairs = [
+        (rng.choice(connected), rng.choice(connected)) for _ in range(queries)
+    ]
+
+    searches = [
+        ("bfs", graph.shortest_path),
+        ("bidirectional", graph.bidirectional_shortest_path),
+    ]
+    for count in landmark_counts:
+        start = time.perf_counter()
+        landmarks = Landmarks.choose(graph, count)
+        print(f"Chose {len(landmarks.people)} landmarks in "
+              f"{time.perf_counter() - start:.2f}s.")
+        searches.append((
+            f"astar ({count} landmarks)",
+            functools.partial(graph.astar_shortest_path, landmarks=landmarks)
+        ))
+
+    print(f"A* benchmark ({len(pairs)} queries)")
+    print(f"  {'search':<24} {'time':>9}  {'rate':>17}  {'expanded/query':>15}")
+    results = {}
+    for label, search in searches:
+        counts = Counter()
+        results[label], elapsed = run_queries(
+            functools.partial(search, counts=counts), pairs
+        )
+        rate = len(pairs) / elapsed if elapsed else float("inf")
+        print(f"  {label:<24} {elapsed:8.3f}s  {rate:10.2f} queries/s"
+              f"  {counts['expanded'] / len(pairs):15.1f}")
+    check_lengths(results)
+
+
+def benchmark_snapshot(directory):
+    print(f"Startup benchmark ({directory})")
+    for backend in degrees.BACKENDS:
+        for label, rebuild in [("csv", True), ("snapshot", False)]:
+            reset_degrees()
+            start = time.perf_counter()
+            degrees.load_data(directory, backend, rebuild)
+            elapsed = time.perf_counter() - start
+            print(f"  {backend + ' from ' + label:<24} {elapsed:8.2f}s")
+
+
+def benchmark_ingest(directory):
+    print(f"Ingestion benchmark ({directory})")
+    print(f"  {'load':<24} {'time':>9}  {'peak RSS':>10}")
+    stats = None
+    for label, load in [
+        ("csr from csv", "graph.Graph.from_csv(directory).stats"),
+        ("dict from csv", "degrees.load_data(directory, 'dict', True)"),
+    ]:
+        stats, elapsed, peak = measure_process(load, directory)
+        print(f"  {label:<24} {elapsed:8.2f}s  {megabytes(peak)}")
+    for stat, count in stats.items():
+        print(f"  {stat:<24} {count:9}")
+
+
+def measure_process(load, directory):
+    """
+    Evaluate the expression `load` in a fresh Python process, where
+    `directory` is defined and degrees and graph are imported, so its
+    peak RSS is not inflated by anything loaded before. Returns the
+    value of `load`, the elapsed time and the peak RSS in bytes.
+    """
+    code = (
+        "import json, resource, sys, time\n"
+        "import degrees, graph\n"
+        "directory = sys.argv[1]\n"
+        "start = time.perf_counter()\n"
+        f"value = {load}\n"
+        "elapsed = time.perf_counter() - start\n"
+        "peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+        "print(json.dumps([value, elapsed, peak]))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code, directory],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True
+    ).stdout
+    value, elapsed, peak = json.loads(output)
+
+    # ru_maxrss is in kilobytes, except on macOS where it is in bytes
+    if sys.platform != "darwin":
+        peak *= 1024
+    return value, elapsed, peak
+
+
+def benchmark_parallel(directory, backend, search, workers, queries, seed):
+    print(f"Loading data from {directory}...")
+    degrees.load_data(directory, backend)
+
+    # Query by names that resolve to exactly one person
+    unique = sorted(
+        ids[0] for ids in map(list, degrees.names.values()) if len(ids) == 1
+    )
+    rng = random.Random(seed)
+    rows = [
+        [degrees.person_details(rng.choice(unique))[0],
+         degrees.person_details(rng.choice(unique))[0]]
+        for _ in range(queries)
+    ]
+
+    print(f"Parallel batch benchmark ({len(rows)} {search} queries, "
+          f"{backend} backend)")
+    baseline = None
+    results = {}
+    for count in workers:
+        start = time.perf_counter()
+        results[count] = [
+            result.get("degrees")
+            for result in degrees.answer_rows(rows, search, count)
+        ]
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        rate = len(rows) / elapsed
+        print(f"  {count:>3} workers  {elapsed:8.3f}s  {rate:10.2f} queries/s"
+              f"  {baseline / elapsed:5.2f}x")
+    check_lengths(results)
+
+
+def benchmark_names(directory, queries, seed):
+    print(f"Loading data from {directory}...")
+    start = time.perf_counter()
+    degrees.load_data(directory, "csr")
+    print(f"Data and name index loaded in {time.perf_counter() - start:.2f}s.")
+    index = degrees.name_index
+
+    # Building the index is part of loading; time it on its own too
+    start = time.perf_counter()
+    NameIndex(index.person_ids, index.person_names, index.weight)
+    print(f"Name index built in {time.perf_counter() - start:.2f}s.")
+
+    rng = random.Random(seed)
+    person_ids = [rng.choice(index.person_ids) for _ in range(queries)]
+    cases = {"exact": [], "prefix": [], "fuzzy": []}
+    for person_id in person_ids:
+        name = degrees.person_details(person_id)[0]
+        cases["exact"].append((person_id, name))
+        cases["prefix"].append((person_id, name[:max(1, len(name) * 2 // 3)]))
+        cases["fuzzy"].append((person_id, misspell(name, rng)))
+
+    print(f"Name lookup benchmark ({queries} lookups each)")
+    for kind, lookups in cases.items():
+        found = 0
+        start = time.perf_counter()
+        for person_id, name in lookups:
+            matches = index.lookup(name, limit=degrees.CANDIDATES)
+            found += person_id in [match[0] for match in matches]
+        elapsed = time.perf_counter() - start
+        print(f"  {kind:<10} {elapsed / len(lookups) * 1e6:10.1f} us/lookup"
+              f"  {found / len(lookups):6.1%} in top {degrees.CANDIDATES}")
+
+
+def misspell(name, rng):
+    """
+    Return `name` with one random character deleted, replaced or inserted.
+    """
+    i = rng.randrange(len(name))
+    letter = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    return rng.choice([
+        name[:i] + name[i + 1:],
+        name[:i] + letter + name[i + 1:],
+        name[:i] + letter + name[i:],
+    ])
+
+
+def measure_load(label, load):
+    """
+    Time `load`, then run it again under tracemalloc to measure the
+    memory still allocated once loading finishes. Returns the result.
+    """
+    start = time.perf_counter()
+    load()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    result = load()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"  {label:<24} {elapsed:8.2f}s  {megabytes(size)}")
+    return result
+
+
+def megabytes(size):
+    return f"{size / 2 ** 20:8.1f} MB"
+
+
+def check_lengths(results):
+    lengths = list(results.values())
+    if any(other != lengths[0] for other in lengths[1:]):
+        print("  WARNING: path lengths differ between runs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import glob
+import os
+import time
+from collections import Counter
+
+from crossword import Crossword
+from generate import CrosswordCreator
+
+# Directory of the example structures and word lists
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the crossword solver on the example puzzles."
+    )
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    ac3 = subparsers.add_parser(
+        "ac3",
+        help="time arc consistency on every structure and word list, and "
+             "count the calls it and solving make"
+    )
+    ac3.add_argument("--repeat", type=int, default=5,
+                     help="runs to take the fastest of")
+
+    args = parser.parse_args()
+
+    if args.benchmark == "ac3":
+        benchmark_ac3(args.repeat)
+
+
+def puzzles():
+    """
+    Return a (structure, words) pair of filenames for each combination of
+    example structure and word list.
+    """
+    structures = sorted(glob.glob(os.path.join(DATA, "structure*.txt")))
+    words = sorted(glob.glob(os.path.join(DATA, "words*.txt")))
+    return [(structure, word) for structure in structures for word in words]
+
+
+def count_calls(counts, obj, name):
+    """
+    Replace method `name` of `obj`, on that object alone, with one that
+    counts its calls in `counts[name]`.
+    """
+    method = getattr(obj, name)
+
+    def counted(*args, **kwargs):
+        counts[name] += 1
+        return method(*args, **kwargs)
+    setattr(obj, name, counted)
+
+
+def benchmark_ac3(repeat):
+    print(f"AC-3 benchmark (fastest of {repeat})")
+    print(f"  {'structure':<16} {'words':<12} {'consistent':>10} "
+          f"{'words left':>10} {'time':>10} {'revisions':>9} "
+          f"{'neighbors':>9} {'solving':>9}")
+    for structure, words in puzzles():
+        crossword = Crossword(structure, words)
+
+        # Calls made by AC-3, and by solving as a whole
+        counts = Counter()
+        creator = CrosswordCreator(crossword)
+        count_calls(counts, creator, "revise")
+        count_calls(counts, crossword, "neighbors")
+        creator.enforce_node_consistency()
+        creator.ac3()
+        revisions = counts["revise"]
+        neighbors = counts["neighbors"]
+        creator = CrosswordCreator(crossword)
+        creator.solve()
+        solving = counts["neighbors"] - neighbors
+        del crossword.neighbors
+
+        best = None
+        for _ in range(repeat):
+            creator = CrosswordCreator(crossword)
+            creator.enforce_node_consistency()
+            start = time.perf_counter()
+            consistent = creator.ac3()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        left = sum(domain.bit_count() for domain in creator.domains.values())
+        print(f"  {os.path.basename(structure):<16} "
+              f"{os.path.basename(words):<12} {str(consistent):>10} "
+              f"{left:10,} {best * 1000:8.2f}ms {revisions:9,} "
+              f"{neighbors:9,} {solving:9,}")
+
+
+if __name__ == "__main__":
+    main()
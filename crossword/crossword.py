@@ -61,6 +61,25 @@ class Crossword():
         with open(words_file) as f:
             self.words = set(f.read().upper().splitlines())
 
+        # Number the words, so that a set of them can be kept as a bitset:
+        # an int whose bit k is set if the set has the kth word
+        self.word_list = sorted(self.words)
+        self.all_words = (1 << len(self.word_list)) - 1
+
+        # Index the words of each length, and those of each length with
+        # each letter at each position, as bitsets
+        self.lengths = dict()
+        self.letters = dict()
+        for k, word in enumerate(self.word_list):
+            bit = 1 << k
+            self.lengths[len(word)] = self.lengths.get(len(word), 0) | bit
+            for position, letter in enumerate(word):
+                key = (len(word), position, letter)
+                self.letters[key] = self.letters.get(key, 0) | bit
+        self.alphabet = sorted(set(
+            letter for _, _, letter in self.letters
+        ))
+
         # Determine variable set
         self.variables = set()
         for i in range(self.height):
@@ -125,9 +144,24 @@ class Crossword():
                         cells2.index(intersection)
                     )
 
+        # Cache each variable's overlapping variables
+        self.adjacent = {
+            var: frozenset(
+                v for v in self.variables
+                if v != var and self.overlaps[v, var]
+            )
+            for var in self.variables
+        }
+
+    def words_in(self, bits):
+        """Given a bitset of words, return the list of its words."""
+        words = []
+        while bits:
+            lowest = bits & -bits
+            words.append(self.word_list[lowest.bit_length() - 1])
+            bits ^= lowest
+        return words
+
     def neighbors(self, var):
         """Given a variable, return set of overlapping variables."""
-        return set(
-            v for v in self.variables
-            if v != var and self.overlaps[v, var]
-        )
+        return self.adjacent[var]
@@ -1,4 +1,5 @@
 import sys
+from collections import deque
 
 from crossword import *
 
@@ -10,8 +11,10 @@ class CrosswordCreator():
         Create new CSP crossword generate.
         """
         self.crossword = crossword
+
+        # Each domain is a bitset of words (see Crossword.word_list)
         self.domains = {
-            var: self.crossword.words.copy()
+            var: self.crossword.all_words
             for var in self.crossword.variables
         }
 
@@ -94,53 +97,58 @@ class CrosswordCreator():
         return self.backtrack(dict())
 
     def enforce_node_consistency(self):
-       
+        """
+        Remove words of the wrong length from every variable's domain.
+        """
         for var in self.domains:
-            to_remove = set()
-            for word in self.domains[var]:
-                if len(word) != var.length:
-                    to_remove.add(word)
-            self.domains[var] -= to_remove
+            self.domains[var] &= self.crossword.lengths.get(var.length, 0)
 
     def revise(self, x, y):
         """
         Make variable `x` arc consistent with variable `y`.
         """
-        revised = False
         overlap = self.crossword.overlaps.get((x, y))
         if overlap is None:
             return False
         i, j = overlap
-        to_remove = set()
-        for word_x in self.domains[x]:
-            remove = True
-            for word_y in self.domains[y]:
-                if word_x[i] == word_y[j]:
-                    remove = False
-                    break
-            if remove:
-                to_remove.add(word_x)
-                revised = True
-        self.domains[x] -= to_remove
-        return revised
+
+        # Keep the words of `x` with a letter at `i` that some word of
+        # `y` has at `j`
+        letters = self.crossword.letters
+        supported = 0
+        for letter in self.crossword.alphabet:
+            if self.domains[y] & letters.get((y.length, j, letter), 0):
+                supported |= letters.get((x.length, i, letter), 0)
+        domain = self.domains[x] & supported
+        if domain == self.domains[x]:
+            return False
+        self.domains[x] = domain
+        return True
 
     def ac3(self, arcs=None):
         """
         Update `self.domains` such that each variable is arc consistent.
         """
-        queue = arcs or [
+        queue = deque(dict.fromkeys(arcs or [
             (x, y)
             for x in self.crossword.variables
             for y in self.crossword.neighbors(x)
-        ]
+        ]))
+
+        # Arcs waiting in the queue, so none is added twice
+        queued = set(queue)
 
         while queue:
-            x, y = queue.pop(0)
+            arc = queue.popleft()
+            queued.remove(arc)
+            x, y = arc
             if self.revise(x, y):
                 if not self.domains[x]:
                     return False
-                for z in self.crossword.neighbors(x) - {y}:
-                    queue.append((z, x))
+                for z in self.crossword.neighbors(x):
+                    if z != y and (z, x) not in queued:
+                        queue.append((z, x))
+                        queued.add((z, x))
         return True
 
     def assignment_complete(self, assignment):
@@ -186,12 +194,18 @@ class CrosswordCreator():
                 if not overlap:
                     continue
                 i, j = overlap
-                for neighbor_word in self.domains[neighbor]:
-                    if value[i] != neighbor_word[j]:
-                        count += 1
+
+                # Words of the neighbor without the value's letter
+                domain = self.domains[neighbor]
+                agreeing = domain & self.crossword.letters.get(
+                    (neighbor.length, j, value[i]), 0
+                )
+                count += domain.bit_count() - agreeing.bit_count()
             return count
 
-        return sorted(self.domains[var], key=count_conflicts)
+        return sorted(
+            self.crossword.words_in(self.domains[var]), key=count_conflicts
+        )
 
     def select_unassigned_variable(self, assignment):
         """
@@ -200,7 +214,10 @@ class CrosswordCreator():
         unassigned = [v for v in self.crossword.variables if v not in assignment]
         return min(
             unassigned,
-            key=lambda var: (len(self.domains[var]), -len(self.crossword.neighbors(var)))
+            key=lambda var: (
+                self.domains[var].bit_count(),
+                -len(self.crossword.neighbors(var))
+            )
         )
 
     def backtrack(self, assignment):
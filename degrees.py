@@ -1,7 +1,18 @@
+import argparse
 import csv
+import functools
+import json
+import multiprocessing
+import os
+import socketserver
+import statistics
 import sys
+import time
+from collections.abc import Mapping
 
-from util import Node, StackFrontier, QueueFrontier
+from graph import load_graph, load_landmarks
+from nameindex import NameIndex
+from util import Node, DequeStackFrontier as StackFrontier, DequeQueueFrontier as QueueFrontier
 
 # Maps names to a set of corresponding person_ids
 names = {}
@@ -12,64 +23,225 @@ people = {}
 # Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
 movies = {}
 
+# Compact integer-indexed graph, loaded by the "csr" backend, which
+# then reads `people` and `movies` from it (see GraphPeople, GraphMovies)
+graph = None
 
-def load_data(directory):
+# Ranked exact, prefix and fuzzy name lookup, built by load_data
+name_index = None
+
+# Landmark distances guiding A* search, loaded with the "csr" backend
+# when asked for
+landmarks = None
+
+# Most candidates reported for a name that is not an unambiguous match
+CANDIDATES = 5
+
+# Storage backends selectable from the command line
+BACKENDS = ["dict", "csr"]
+
+# Search strategies selectable from the command line
+SEARCHES = ["bfs", "bidirectional", "astar"]
+
+# Descriptions of the rows skipped while loading the CSV files
+SKIPPED = {
+    "malformed_rows": "rows with missing columns",
+    "duplicate_people": "people with duplicate IDs",
+    "duplicate_movies": "movies with duplicate IDs",
+    "stars_unknown_person": "stars rows naming an unknown person",
+    "stars_unknown_movie": "stars rows naming an unknown movie",
+    "duplicate_stars": "duplicate stars rows",
+}
+
+
+def load_data(directory, backend="dict", rebuild=False, with_landmarks=False):
     """
     Load data from CSV files into memory.
+
+    The CSV files are parsed once and cached in a binary snapshot next to
+    them, which later runs memory-map instead (unless `rebuild` is set).
+    The "dict" backend fills `people` and `movies`; the "csr" backend
+    fills `graph` and makes them views of it. Both fill `names` and
+    `name_index`. Landmark distances for A* search are cached the same
+    way, and loaded into `landmarks` if `with_landmarks` is set (which
+    needs the "csr" backend).
+
+    Returns the counts of rows read and skipped when the CSV files
+    were parsed.
     """
+    global graph, name_index, landmarks, people, movies
+    loaded = load_graph(directory, rebuild)
+
+    # Rank people with the same name by how many movies they starred in
+    offsets = loaded.person_offsets
+    name_index = NameIndex(
+        loaded.person_ids, loaded.person_names,
+        weight=lambda i: offsets[i + 1] - offsets[i]
+    )
+
+    if backend == "csr":
+        graph = loaded
+        people = GraphPeople(graph)
+        movies = GraphMovies(graph)
+        if with_landmarks:
+            landmarks = load_landmarks(directory, graph, rebuild=rebuild)
+        for person_id, name in zip(graph.person_ids, graph.person_names):
+            names.setdefault(name.lower(), set()).add(person_id)
+        return loaded.stats
+
     # Load people
-    with open(f"{directory}/people.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            people[row["id"]] = {
-                "name": row["name"],
-                "birth": row["birth"],
-                "movies": set()
+    person_offsets = loaded.person_offsets
+    for i, person_id in enumerate(loaded.person_ids):
+        name = loaded.person_names[i]
+        people[person_id] = {
+            "name": name,
+            "birth": loaded.person_births[i],
+            "movies": {
+                loaded.movie_ids[movie]
+                for movie in loaded.person_movies[person_offsets[i]:person_offsets[i + 1]]
             }
-            if row["name"].lower() not in names:
-                names[row["name"].lower()] = {row["id"]}
-            else:
-                names[row["name"].lower()].add(row["id"])
+        }
+        if name.lower() not in names:
+            names[name.lower()] = {person_id}
+        else:
+            names[name.lower()].add(person_id)
 
     # Load movies
-    with open(f"{directory}/movies.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            movies[row["id"]] = {
-                "title": row["title"],
-                "year": row["year"],
-                "stars": set()
+    movie_offsets = loaded.movie_offsets
+    for i, movie_id in enumerate(loaded.movie_ids):
+        movies[movie_id] = {
+            "title": loaded.movie_titles[i],
+            "year": loaded.movie_years[i],
+            "stars": {
+                loaded.person_ids[person]
+                for person in loaded.movie_people[movie_offsets[i]:movie_offsets[i + 1]]
+            }
+        }
+    return loaded.stats
+
+
+class GraphPeople(Mapping):
+    """
+    Read-only view of a Graph's people in the form of `people`, built
+    one person at a time when looked up.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, person_id):
+        graph = self.graph
+        i = graph.person_index[person_id]
+        start, end = graph.person_offsets[i], graph.person_offsets[i + 1]
+        return {
+            "name": graph.person_names[i],
+            "birth": graph.person_births[i],
+            "movies": {
+                graph.movie_ids[movie] for movie in graph.person_movies[start:end]
+            }
+        }
+
+    def __iter__(self):
+        return iter(self.graph.person_ids)
+
+    def __len__(self):
+        return len(self.graph.person_ids)
+
+
+class GraphMovies(Mapping):
+    """
+    Read-only view of a Graph's movies in the form of `movies`, built
+    one movie at a time when looked up.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, movie_id):
+        graph = self.graph
+        i = graph.movie_index[movie_id]
+        start, end = graph.movie_offsets[i], graph.movie_offsets[i + 1]
+        return {
+            "title": graph.movie_titles[i],
+            "year": graph.movie_years[i],
+            "stars": {
+                graph.person_ids[person] for person in graph.movie_people[start:end]
             }
+        }
+
+    def __iter__(self):
+        return iter(self.graph.movie_ids)
 
-    # Load stars
-    with open(f"{directory}/stars.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                people[row["person_id"]]["movies"].add(row["movie_id"])
-                movies[row["movie_id"]]["stars"].add(row["person_id"])
-            except KeyError:
-                pass
+    def __len__(self):
+        return len(self.graph.movie_ids)
 
 
 def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    parser = argparse.ArgumentParser(
+        description="Find the degrees of separation between two actors."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--search", choices=SEARCHES, default="bfs",
+                        help="search strategy (default: bfs; astar uses "
+                             "the csr backend)")
+    parser.add_argument("--backend", choices=BACKENDS, default="dict",
+                        help="in-memory graph representation (default: dict)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="re-read the CSV files instead of the cached snapshot")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--batch", metavar="FILE",
+                      help="answer 'source,target' name pairs from FILE "
+                           "(- for stdin) as JSON lines")
+    mode.add_argument("--socket", metavar="PATH",
+                      help="serve 'source,target' queries over a Unix socket")
+    mode.add_argument("--distances", metavar="NAME",
+                      help="compute every person's distance from NAME "
+                           "(uses the csr backend)")
+    parser.add_argument("--output", metavar="FILE",
+                        help="file to save --distances results to")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes answering --batch queries in parallel "
+                             "(default: 1)")
+    args = parser.parse_args()
+
+    # Keep stdout for results when answering queries non-interactively
+    status = sys.stderr if args.batch or args.socket else sys.stdout
 
     # Load data from files into memory
-    print("Loading data...")
-    load_data(directory)
-    print("Data loaded.")
-
-    source = person_id_for_name(input("Name: "))
+    print("Loading data...", file=status)
+    astar = args.search == "astar"
+    backend = "csr" if args.distances or astar else args.backend
+    stats = load_data(args.directory, backend, args.rebuild, astar)
+    print("Data loaded.", file=status)
+    for stat, description in SKIPPED.items():
+        if stats.get(stat):
+            print(f"Skipped {stats[stat]} {description}.", file=status)
+
+    if args.distances:
+        run_distances(args.distances, args.output)
+        return
+
+    if args.batch:
+        if args.batch == "-":
+            run_batch(sys.stdin, sys.stdout, args.search, args.workers)
+        else:
+            with open(args.batch, encoding="utf-8") as f:
+                run_batch(f, sys.stdout, args.search, args.workers)
+        return
+    if args.socket:
+        serve(args.socket, args.search)
+        return
+
+    name = input("Name: ")
+    source = person_id_for_name(name)
     if source is None:
-        sys.exit("Person not found.")
-    target = person_id_for_name(input("Name: "))
+        sys.exit(not_found(name))
+    name = input("Name: ")
+    target = person_id_for_name(name)
     if target is None:
-        sys.exit("Person not found.")
+        sys.exit(not_found(name))
 
-    path = shortest_path(source, target)
+    path = search_function(args.search)(source, target)
 
     if path is None:
         print("Not connected.")
@@ -78,12 +250,344 @@ def main():
         print(f"{degrees} degrees of separation.")
         path = [(None, source)] + path
         for i in range(degrees):
-            person1 = people[path[i][1]]["name"]
-            person2 = people[path[i + 1][1]]["name"]
-            movie = movies[path[i + 1][0]]["title"]
+            person1 = person_details(path[i][1])[0]
+            person2 = person_details(path[i + 1][1])[0]
+            movie = movie_title(path[i + 1][0])
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 
+def person_details(person_id):
+    """
+    Returns the (name, birth) of a person from the loaded backend.
+    """
+    if graph is not None:
+        i = graph.person_index[person_id]
+        return graph.person_names[i], graph.person_births[i]
+    return people[person_id]["name"], people[person_id]["birth"]
+
+
+def movie_title(movie_id):
+    """
+    Returns the title of a movie from the loaded backend.
+    """
+    if graph is not None:
+        return graph.movie_titles[graph.movie_index[movie_id]]
+    return movies[movie_id]["title"]
+
+
+def search_function(name):
+    """
+    Returns the path-finding function for a search strategy in SEARCHES,
+    using the loaded backend.
+    """
+    if graph is not None:
+        return {
+            "bfs": graph.shortest_path,
+            "bidirectional": graph.bidirectional_shortest_path,
+            "astar": functools.partial(
+                graph.astar_shortest_path, landmarks=landmarks
+            ),
+        }[name]
+    return {
+        "bfs": shortest_path,
+        "bidirectional": bidirectional_shortest_path,
+    }[name]
+
+
+def bidirectional_shortest_path(source, target):
+    """
+    Returns the same result as `shortest_path`, but grows the search
+    from both `source` and `target` and stops when the two searches meet.
+    """
+    if source == target:
+        return []
+
+    # Maps each person_id reached from one side to the (movie_id, person_id)
+    # step leading back towards that side's starting person
+    forward = {source: None}
+    backward = {target: None}
+    forward_layer = [source]
+    backward_layer = [target]
+
+    while forward_layer and backward_layer:
+
+        # Expand a full layer on whichever side has the smaller frontier;
+        # the first person reached by both sides is on a shortest path
+        if len(forward_layer) <= len(backward_layer):
+            forward_layer, meeting = expand_layer(
+                forward_layer, forward, backward
+            )
+        else:
+            backward_layer, meeting = expand_layer(
+                backward_layer, backward, forward
+            )
+        if meeting is not None:
+            return join_paths(forward, backward, meeting)
+
+    return None
+
+
+def expand_layer(layer, parents, other_parents):
+    """
+    Expands every person in `layer`, recording new people in `parents`.
+
+    Returns the next layer, and the first person_id already reached by
+    the other side (or None if the two sides have not met).
+    """
+    next_layer = []
+    for person_id in layer:
+        for movie_id, neighbor_id in neighbors_for_person(person_id):
+            if neighbor_id in parents:
+                continue
+            parents[neighbor_id] = (movie_id, person_id)
+            if neighbor_id in other_parents:
+                return next_layer, neighbor_id
+            next_layer.append(neighbor_id)
+    return next_layer, None
+
+
+def join_paths(forward, backward, meeting):
+    """
+    Returns the (movie_id, person_id) path from the source to the target
+    through `meeting`, the person where the two searches met.
+    """
+    path = []
+    person_id = meeting
+    while forward[person_id] is not None:
+        movie_id, parent_id = forward[person_id]
+        path.append((movie_id, person_id))
+        person_id = parent_id
+    path.reverse()
+
+    person_id = meeting
+    while backward[person_id] is not None:
+        movie_id, person_id = backward[person_id]
+        path.append((movie_id, person_id))
+    return path
+
+
+def run_distances(name, output=None):
+    """
+    Compute the distance from the person called `name` to everyone else
+    in a single BFS, print a summary, and optionally save the result.
+    """
+    source = person_id_for_name(name)
+    if source is None:
+        sys.exit(not_found(name))
+
+    start = time.perf_counter()
+    distances = graph.distances_from(source)
+    elapsed = time.perf_counter() - start
+
+    counts = {}
+    for distance in distances.distances:
+        counts[distance] = counts.get(distance, 0) + 1
+    reached = len(distances.distances) - counts.get(-1, 0)
+    print(f"Reached {reached} of {len(distances.distances)} people "
+          f"in {elapsed:.2f}s.")
+    print(f"Eccentricity: {max(counts)}")
+    for distance in sorted(counts):
+        if distance >= 0:
+            print(f"  {distance}: {counts[distance]}")
+
+    if output:
+        distances.save(output)
+        print(f"Saved distances to {output}.")
+
+
+def run_batch(lines, output, search, workers=1):
+    """
+    Answer one 'source,target' query per line of `lines`, writing each
+    result to `output` as a JSON line, then report latency to stderr.
+    """
+    latencies = []
+    start = time.perf_counter()
+    for result in answer_rows(query_rows(lines), search, workers):
+        latencies.append(result["seconds"])
+        print(json.dumps(result), file=output, flush=True)
+    print(latency_summary(latencies, time.perf_counter() - start),
+          file=sys.stderr)
+
+
+def query_rows(lines):
+    """
+    Yield the fields of each non-blank 'source,target' line of `lines`.
+    Names containing commas may be quoted as in a CSV file.
+    """
+    for row in csv.reader(lines):
+        if row and any(field.strip() for field in row):
+            yield row
+
+
+def answer_rows(rows, search, workers=1):
+    """
+    Yield a result for each query row, in order.
+
+    With more than one worker, rows are answered by a pool of forked
+    processes. Workers inherit the loaded data instead of receiving a
+    pickled copy, and with the CSR backend the snapshot's mapped pages are
+    shared outright. Without fork, rows are answered in this process.
+    """
+    answer = functools.partial(answer_row, search=search)
+    if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        yield from map(answer, rows)
+        return
+
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        yield from pool.imap(answer, rows, chunksize=8)
+
+
+def answer_row(row, search):
+    """
+    Returns the result for one row of query fields.
+    """
+    if len(row) != 2:
+        return {
+            "query": ",".join(row),
+            "error": "expected 'source,target'",
+            "seconds": 0.0
+        }
+    return answer_query(row[0].strip(), row[1].strip(), search)
+
+
+def answer_query(source_name, target_name, search):
+    """
+    Returns a JSON-serializable result for the path between two names
+    using the search strategy `search`, including the time taken to
+    answer it in seconds.
+    """
+    start = time.perf_counter()
+    result = {"source": source_name, "target": target_name}
+
+    person_ids = []
+    for role, name in [("source", source_name), ("target", target_name)]:
+        person_id, candidates, error = resolve_name(name)
+        if error is not None:
+            result["error"] = error
+            break
+        result[f"{role}_id"] = person_id
+        if candidates:
+            result[f"{role}_candidates"] = candidates
+        person_ids.append(person_id)
+    else:
+        source, target = person_ids
+        path = search_function(search)(source, target)
+        result["degrees"] = None if path is None else len(path)
+        result["path"] = None if path is None else describe_path(source, path)
+
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def resolve_name(name):
+    """
+    Returns (person_id, candidates, error) for a name without prompting
+    the user, choosing the best-ranked match from `name_index`.
+
+    Unless the choice was the only exact match, candidates lists the
+    top-ranked matches it was chosen from; otherwise it is None.
+    """
+    matches = name_index.lookup(name, limit=CANDIDATES)
+    if not matches:
+        return None, None, f"person not found: {name}"
+
+    person_id, kind, distance = matches[0]
+    if kind == "exact" and (len(matches) == 1 or matches[1][1] != "exact"):
+        return person_id, None, None
+
+    candidates = []
+    for candidate_id, kind, distance in matches:
+        candidate_name, birth = person_details(candidate_id)
+        candidates.append({
+            "id": candidate_id,
+            "name": candidate_name,
+            "birth": birth,
+            "match": kind,
+            "distance": distance
+        })
+    return person_id, candidates, None
+
+
+def not_found(name):
+    """
+    Returns a "Person not found." message suggesting close matches
+    for `name`.
+    """
+    suggestions = [
+        person_details(person_id)[0]
+        for person_id, _, _ in name_index.lookup(name, limit=3)
+    ]
+    if not suggestions:
+        return "Person not found."
+    return f"Person not found. Did you mean: {', '.join(suggestions)}?"
+
+
+def describe_path(source, path):
+    """
+    Returns one dictionary per step of `path`, naming both people
+    and the movie they starred in.
+    """
+    steps = []
+    previous = source
+    for movie_id, person_id in path:
+        steps.append({
+            "from": person_details(previous)[0],
+            "to": person_details(person_id)[0],
+            "movie": movie_title(movie_id),
+            "movie_id": movie_id,
+            "person_id": person_id
+        })
+        previous = person_id
+    return steps
+
+
+def latency_summary(latencies, elapsed):
+    """
+    Returns a one-line summary of query count, throughput over `elapsed`
+    wall-clock seconds, and per-query latency.
+    """
+    if not latencies:
+        return "0 queries."
+    mean = sum(latencies) / len(latencies)
+    median = statistics.median(latencies)
+    worst = max(latencies)
+    rate = len(latencies) / elapsed if elapsed else float("inf")
+    return (
+        f"{len(latencies)} queries in {elapsed:.3f}s ({rate:.1f} queries/s; "
+        f"latency mean {mean * 1000:.2f} ms, "
+        f"median {median * 1000:.2f} ms, max {worst * 1000:.2f} ms)"
+    )
+
+
+def serve(path, search):
+    """
+    Answer 'source,target' queries over a Unix socket at `path` until
+    interrupted. Each connection receives one JSON line per query line.
+    """
+    class QueryHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            lines = (line.decode("utf-8") for line in self.rfile)
+            latencies = []
+            start = time.perf_counter()
+            for result in answer_rows(query_rows(lines), search):
+                latencies.append(result["seconds"])
+                self.wfile.write(json.dumps(result).encode("utf-8") + b"\n")
+                self.wfile.flush()
+            print(latency_summary(latencies, time.perf_counter() - start),
+                  file=sys.stderr)
+
+    if os.path.exists(path):
+        os.remove(path)
+    with socketserver.ThreadingUnixStreamServer(path, QueryHandler) as server:
+        print(f"Serving queries on {path}.", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(path)
+
+
 # ----------------- DON'T EDIT BELOW THIS LINE -----------------
 
 
@@ -0,0 +1,761 @@
+import csv
+import heapq
+import itertools
+import json
+import mmap
+import operator
+import os
+import struct
+import sys
+from array import array
+
+# Snapshots are cached next to the CSV files they were built from
+SNAPSHOT_FILENAME = "graph.snapshot"
+SNAPSHOT_MAGIC = b"DEGREES\0"
+
+# Bump whenever the snapshot layout changes
+SNAPSHOT_VERSION = 3
+
+# Single-source distance files
+DISTANCES_MAGIC = b"DEGDIST\0"
+DISTANCES_VERSION = 1
+
+# Landmark distances used by A* search, cached next to the snapshot
+LANDMARKS_FILENAME = "landmarks.snapshot"
+LANDMARKS_MAGIC = b"DEGLAND\0"
+LANDMARKS_VERSION = 1
+
+# Landmarks picked for A* search unless asked otherwise
+LANDMARK_COUNT = 8
+
+CSV_FILENAMES = ["people.csv", "movies.csv", "stars.csv"]
+
+# Rows parsed at a time while reading the CSV files
+CHUNK_SIZE = 4096
+
+# Counts of rows read and skipped while loading the CSV files
+INGEST_STATS = [
+    "people", "movies", "stars", "malformed_rows",
+    "duplicate_people", "duplicate_movies",
+    "stars_unknown_person", "stars_unknown_movie",
+    "dropped_stars", "duplicate_stars",
+]
+
+# Graph attributes stored in a snapshot
+STRING_TABLES = [
+    "person_ids", "person_names", "person_births",
+    "movie_ids", "movie_titles", "movie_years",
+]
+ARRAY_TABLES = [
+    "person_offsets", "person_movies", "movie_offsets", "movie_people",
+]
+
+
+class Graph():
+    """
+    Co-star graph with people and movies interned to integer indices.
+
+    Edges are stored in compressed sparse row (CSR) form: the movies of
+    person `p` are `person_movies[person_offsets[p]:person_offsets[p + 1]]`
+    and the stars of movie `m` are
+    `movie_people[movie_offsets[m]:movie_offsets[m + 1]]`.
+    """
+
+    def __init__(self, person_ids, person_names, person_births,
+                 movie_ids, movie_titles, movie_years,
+                 person_offsets, person_movies, movie_offsets, movie_people,
+                 stats=None, person_index=None, movie_index=None):
+        self.person_ids = person_ids
+        self.person_names = person_names
+        self.person_births = person_births
+        self.movie_ids = movie_ids
+        self.movie_titles = movie_titles
+        self.movie_years = movie_years
+        self.person_offsets = person_offsets
+        self.person_movies = person_movies
+        self.movie_offsets = movie_offsets
+        self.movie_people = movie_people
+
+        # Rows read and skipped when the graph was built (see INGEST_STATS)
+        self.stats = stats or {}
+
+        # Map string IDs back to their integer indices
+        if person_index is None:
+            person_index = dict(zip(person_ids, range(len(person_ids))))
+        if movie_index is None:
+            movie_index = dict(zip(movie_ids, range(len(movie_ids))))
+        self.person_index = person_index
+        self.movie_index = movie_index
+
+    @classmethod
+    def from_csv(cls, directory):
+        """
+        Load a graph from the people, movies and stars CSV files
+        in `directory`.
+
+        Files are streamed CHUNK_SIZE rows at a time, so only the columns
+        that are kept and the edge arrays grow with the data. Repeated
+        birth and year strings are interned. Rows that cannot be used are
+        skipped and counted in `stats` rather than silently dropped.
+        """
+        stats = dict.fromkeys(INGEST_STATS, 0)
+
+        person_ids, person_names, person_births = [], [], []
+        for ids, names, births in read_columns(
+            f"{directory}/people.csv", ["id", "name", "birth"], stats
+        ):
+            person_ids.extend(ids)
+            person_names.extend(names)
+            person_births.extend(map(sys.intern, births))
+        person_index = dict(zip(person_ids, range(len(person_ids))))
+        stats["people"] = len(person_ids)
+        stats["duplicate_people"] = len(person_ids) - len(person_index)
+
+        movie_ids, movie_titles, movie_years = [], [], []
+        for ids, titles, years in read_columns(
+            f"{directory}/movies.csv", ["id", "title", "year"], stats
+        ):
+            movie_ids.extend(ids)
+            movie_titles.extend(titles)
+            movie_years.extend(map(sys.intern, years))
+        movie_index = dict(zip(movie_ids, range(len(movie_ids))))
+        stats["movies"] = len(movie_ids)
+        stats["duplicate_movies"] = len(movie_ids) - len(movie_index)
+
+        # Keep only edges whose person and movie both exist
+        edge_people = array("i")
+        edge_movies = array("i")
+        for star_people, star_movies in read_columns(
+            f"{directory}/stars.csv", ["person_id", "movie_id"], stats
+        ):
+            stats["stars"] += len(star_people)
+            people = list(map(person_index.get, star_people))
+            movies = list(map(movie_index.get, star_movies))
+            if None in people or None in movies:
+                stats["stars_unknown_person"] += people.count(None)
+                stats["stars_unknown_movie"] += movies.count(None)
+                kept = [
+                    (person, movie) for person, movie in zip(people, movies)
+                    if person is not None and movie is not None
+                ]
+                stats["dropped_stars"] += len(people) - len(kept)
+                people = [person for person, _ in kept]
+                movies = [movie for _, movie in kept]
+            edge_people.extend(people)
+            edge_movies.extend(movies)
+
+        person_offsets, person_movies = build_csr(
+            len(person_ids), edge_people, edge_movies
+        )
+        stats["duplicate_stars"] = len(edge_people) - len(person_movies)
+        movie_offsets, movie_people = build_csr(
+            len(movie_ids), edge_movies, edge_people
+        )
+        return cls(
+            person_ids, person_names, person_births,
+            movie_ids, movie_titles, movie_years,
+            person_offsets, person_movies, movie_offsets, movie_people,
+            stats, person_index, movie_index
+        )
+
+    def save(self, filename, sources):
+        """
+        Write the graph to a binary snapshot at `filename`, recording
+        `sources` (see `csv_fingerprint`) so stale snapshots can be detected.
+        """
+        sections = {}
+        for name in STRING_TABLES:
+            sections[name] = "\0".join(getattr(self, name)).encode("utf-8")
+        for name in ARRAY_TABLES:
+            sections[name] = getattr(self, name).tobytes()
+        header = {
+            "version": SNAPSHOT_VERSION,
+            "sources": sources,
+            "counts": {name: len(getattr(self, name)) for name in STRING_TABLES},
+            "stats": self.stats,
+        }
+        write_sections(filename, SNAPSHOT_MAGIC, header, sections)
+
+    @classmethod
+    def load(cls, filename, sources):
+        """
+        Memory-map a snapshot written by `save`.
+
+        Returns None if the snapshot is missing, was written by another
+        version or platform, or was not built from `sources`.
+        """
+        contents = read_sections(filename, SNAPSHOT_MAGIC)
+        if contents is None:
+            return None
+        header, sections = contents
+        if (header.get("version") != SNAPSHOT_VERSION or
+                header.get("sources") != sources):
+            return None
+
+        # Arrays are zero-copy views into the mapped file
+        tables = {}
+        for name in STRING_TABLES:
+            if header["counts"][name]:
+                tables[name] = str(sections[name], "utf-8").split("\0")
+            else:
+                tables[name] = []
+        for name in ARRAY_TABLES:
+            tables[name] = sections[name].cast("i")
+        return cls(**tables, stats=header["stats"])
+
+    def distances_from(self, source):
+        """
+        Run a single BFS from the person ID `source`, returning the
+        Distances to every person in the graph.
+        """
+        person_offsets = self.person_offsets
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_people = self.movie_people
+
+        n = len(self.person_ids)
+        distances = array("h", [-1]) * n
+        parents = array("i", [-1]) * n
+        parent_movies = array("i", [-1]) * n
+        seen_movies = bytearray(len(self.movie_ids))
+
+        source = self.person_index[source]
+        distances[source] = 0
+        layer = [source]
+        depth = 0
+        while layer:
+            depth += 1
+            next_layer = []
+            for person in layer:
+                for k in range(person_offsets[person], person_offsets[person + 1]):
+                    movie = person_movies[k]
+                    if seen_movies[movie]:
+                        continue
+                    seen_movies[movie] = 1
+                    for j in range(movie_offsets[movie], movie_offsets[movie + 1]):
+                        star = movie_people[j]
+                        if distances[star] < 0:
+                            distances[star] = depth
+                            parents[star] = person
+                            parent_movies[star] = movie
+                            next_layer.append(star)
+            layer = next_layer
+
+        return Distances(self.person_ids[source], distances, parents, parent_movies)
+
+    def shortest_path(self, source, target, counts=None):
+        """
+        Returns the shortest list of (movie_id, person_id) pairs
+        that connect the person IDs `source` and `target`, using BFS.
+
+        If no possible path, returns None. If `counts` (a Counter) is
+        given, the number of people expanded is added to counts["expanded"].
+        """
+        source = self.person_index[source]
+        target = self.person_index[target]
+        if source == target:
+            return []
+
+        parents = {source: None}
+        seen_movies = set()
+        layer = [source]
+        while layer:
+            layer, meeting = self.expand_layer(
+                layer, parents, seen_movies, {target}, counts
+            )
+            if meeting is not None:
+                return self.path_to(parents, meeting)
+        return None
+
+    def bidirectional_shortest_path(self, source, target, counts=None):
+        """
+        Returns the same result as `shortest_path`, but grows the search
+        from both `source` and `target` and stops when the two searches meet.
+        """
+        source = self.person_index[source]
+        target = self.person_index[target]
+        if source == target:
+            return []
+
+        forward, backward = {source: None}, {target: None}
+        forward_movies, backward_movies = set(), set()
+        forward_layer, backward_layer = [source], [target]
+        while forward_layer and backward_layer:
+            if len(forward_layer) <= len(backward_layer):
+                forward_layer, meeting = self.expand_layer(
+                    forward_layer, forward, forward_movies, backward, counts
+                )
+            else:
+                backward_layer, meeting = self.expand_layer(
+                    backward_layer, backward, backward_movies, forward, counts
+                )
+            if meeting is not None:
+                path = self.path_to(forward, meeting)
+                person = meeting
+                while backward[person] is not None:
+                    movie, person = backward[person]
+                    path.append((self.movie_ids[movie], self.person_ids[person]))
+                return path
+        return None
+
+    def astar_shortest_path(self, source, target, landmarks, counts=None):
+        """
+        Returns the same result as `shortest_path`, using A* search guided
+        by the lower bounds from `landmarks` (see Landmarks).
+
+        The bounds are consistent, so a person's distance is final once
+        they are expanded. Unlike in BFS, a movie may be reached again by
+        a later person with a shorter distance, and is then expanded again.
+        """
+        source = self.person_index[source]
+        target = self.person_index[target]
+        if source == target:
+            return []
+        if landmarks.disconnected(source, target):
+            return None
+        bound = landmarks.bound_to(target)
+        estimate = bound(source)
+
+        person_offsets = self.person_offsets
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_people = self.movie_people
+
+        # Queue entries are (distance + bound, -distance, person), so
+        # among equally promising people the deepest is expanded first
+        distances = {source: 0}
+        parents = {source: None}
+        movie_distances = {}
+        queue = [(estimate, 0, source)]
+        expanded = 0
+        path = None
+        while queue:
+            estimate, depth, person = heapq.heappop(queue)
+            depth = -depth
+            if depth > distances[person]:
+                continue
+            if person == target:
+                path = self.path_to(parents, person)
+                break
+            expanded += 1
+
+            depth += 1
+            for k in range(person_offsets[person], person_offsets[person + 1]):
+                movie = person_movies[k]
+                if movie_distances.get(movie, depth + 1) <= depth:
+                    continue
+                movie_distances[movie] = depth
+                for j in range(movie_offsets[movie], movie_offsets[movie + 1]):
+                    star = movie_people[j]
+                    if distances.get(star, depth + 1) <= depth:
+                        continue
+                    distances[star] = depth
+                    parents[star] = (movie, person)
+
+                    # No path can be shorter than the smallest estimate
+                    # still queued, so reaching the target at exactly
+                    # that distance is final
+                    if star == target and depth == estimate:
+                        path = self.path_to(parents, star)
+                        break
+                    heapq.heappush(queue, (depth + bound(star), -depth, star))
+                if path is not None:
+                    break
+            if path is not None:
+                break
+
+        if counts is not None:
+            counts["expanded"] += expanded
+        return path
+
+    def expand_layer(self, layer, parents, seen_movies, goals, counts=None):
+        """
+        Expands every person in `layer`, recording new people in `parents`.
+
+        Each movie is only expanded once per search, since its stars are
+        all reached the first time it is seen. Returns the next layer, and
+        the first person reached that is in `goals` (or None). The people
+        expanded are added to counts["expanded"] if `counts` is given.
+        """
+        person_offsets = self.person_offsets
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_people = self.movie_people
+
+        next_layer = []
+        for expanded, person in enumerate(layer, 1):
+            for k in range(person_offsets[person], person_offsets[person + 1]):
+                movie = person_movies[k]
+                if movie in seen_movies:
+                    continue
+                seen_movies.add(movie)
+                for j in range(movie_offsets[movie], movie_offsets[movie + 1]):
+                    star = movie_people[j]
+                    if star in parents:
+                        continue
+                    parents[star] = (movie, person)
+                    if star in goals:
+                        if counts is not None:
+                            counts["expanded"] += expanded
+                        return next_layer, star
+                    next_layer.append(star)
+        if counts is not None:
+            counts["expanded"] += len(layer)
+        return next_layer, None
+
+    def path_to(self, parents, person):
+        """
+        Returns the (movie_id, person_id) path from the root of `parents`
+        to the person at index `person`.
+        """
+        path = []
+        while parents[person] is not None:
+            movie, parent = parents[person]
+            path.append((self.movie_ids[movie], self.person_ids[person]))
+            person = parent
+        path.reverse()
+        return path
+
+
+class Distances():
+    """
+    Distances from one source person to every person in a graph, with the
+    parent pointers needed to rebuild a shortest path to each of them.
+
+    Arrays are indexed like `Graph.person_ids`. Unreachable people have a
+    distance of -1; they and the source have a parent of -1.
+    """
+
+    def __init__(self, source, distances, parents, parent_movies):
+        self.source = source
+        self.distances = distances
+        self.parents = parents
+        self.parent_movies = parent_movies
+
+    def save(self, filename):
+        """
+        Write the distances and parent pointers to a binary file.
+        """
+        header = {
+            "version": DISTANCES_VERSION,
+            "source": self.source,
+            "count": len(self.distances),
+        }
+        write_sections(filename, DISTANCES_MAGIC, header, {
+            "distances": self.distances.tobytes(),
+            "parents": self.parents.tobytes(),
+            "parent_movies": self.parent_movies.tobytes(),
+        })
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Memory-map a file written by `save`, or return None if it is
+        missing or unreadable.
+        """
+        contents = read_sections(filename, DISTANCES_MAGIC)
+        if contents is None:
+            return None
+        header, sections = contents
+        if header.get("version") != DISTANCES_VERSION:
+            return None
+        return cls(
+            header["source"],
+            sections["distances"].cast("h"),
+            sections["parents"].cast("i"),
+            sections["parent_movies"].cast("i")
+        )
+
+    def path_to(self, graph, person_id):
+        """
+        Returns the shortest list of (movie_id, person_id) pairs that
+        connect the source to `person_id`, or None if not connected.
+        """
+        person = graph.person_index[person_id]
+        if self.distances[person] < 0:
+            return None
+        path = []
+        while self.parents[person] >= 0:
+            path.append((
+                graph.movie_ids[self.parent_movies[person]],
+                graph.person_ids[person]
+            ))
+            person = self.parents[person]
+        path.reverse()
+        return path
+
+
+class Landmarks():
+    """
+    Distances from a few landmark people to every person in a graph.
+
+    For any landmark L, |d(L, a) - d(L, b)| is at most the distance
+    between a and b (the triangle inequality), so the largest such
+    difference is a lower bound A* search can use. Distances are arrays
+    indexed like `Graph.person_ids`, with -1 for unreachable people.
+    """
+
+    def __init__(self, people, distances):
+        self.people = people
+        self.distances = distances
+
+    @classmethod
+    def choose(cls, graph, count=LANDMARK_COUNT):
+        """
+        Pick up to `count` landmarks from the people who starred in the
+        most movies, skipping anyone who starred with a landmark already
+        picked, and run a BFS from each.
+        """
+        offsets = graph.person_offsets
+        order = sorted(
+            range(len(graph.person_ids)),
+            key=lambda i: offsets[i] - offsets[i + 1]
+        )
+        people, distances = [], []
+        for person in order:
+            if len(people) == count:
+                break
+            if any(0 <= d[person] <= 1 for d in distances):
+                continue
+            people.append(graph.person_ids[person])
+            distances.append(graph.distances_from(people[-1]).distances)
+        return cls(people, distances)
+
+    def save(self, filename, sources, count):
+        """
+        Write the landmark distances to a binary file, recording the
+        `count` of landmarks asked for and the CSV `sources` they were
+        computed from.
+        """
+        header = {
+            "version": LANDMARKS_VERSION,
+            "sources": sources,
+            "count": count,
+            "people": self.people,
+        }
+        write_sections(filename, LANDMARKS_MAGIC, header, {
+            str(i): distances.tobytes()
+            for i, distances in enumerate(self.distances)
+        })
+
+    @classmethod
+    def load(cls, filename, sources, count):
+        """
+        Memory-map a file written by `save`, or return None if it is
+        missing, unreadable or not computed from `sources` for `count`
+        landmarks.
+        """
+        contents = read_sections(filename, LANDMARKS_MAGIC)
+        if contents is None:
+            return None
+        header, sections = contents
+        if (header.get("version") != LANDMARKS_VERSION or
+                header.get("sources") != sources or
+                header.get("count") != count):
+            return None
+        return cls(header["people"], [
+            sections[str(i)].cast("h") for i in range(len(header["people"]))
+        ])
+
+    def disconnected(self, a, b):
+        """
+        Returns True if some landmark reaches only one of the people at
+        indices `a` and `b`, so no path connects them.
+        """
+        return any(
+            (distances[a] < 0) != (distances[b] < 0)
+            for distances in self.distances
+        )
+
+    def bound_to(self, target):
+        """
+        Returns a function giving a lower bound on the distance from the
+        person at a given index, who must be connected to the person at
+        index `target`, to `target`.
+        """
+        # Landmarks that cannot reach the target cannot reach anyone
+        # connected to it either
+        pairs = [
+            (distances, distances[target])
+            for distances in self.distances if distances[target] >= 0
+        ]
+        if not pairs:
+            return lambda person: 0
+        return lambda person: max([
+            abs(distances[person] - to_target) for distances, to_target in pairs
+        ])
+
+
+def load_graph(directory, rebuild=False):
+    """
+    Load the graph for `directory` from its snapshot if it is up to date.
+    Otherwise (or if `rebuild` is set), parse the CSV files and write a
+    fresh snapshot.
+    """
+    filename = os.path.join(directory, SNAPSHOT_FILENAME)
+    sources = csv_fingerprint(directory)
+    graph = None if rebuild else Graph.load(filename, sources)
+    if graph is None:
+        graph = Graph.from_csv(directory)
+        try:
+            graph.save(filename, sources)
+        except OSError:
+            # The snapshot is only a cache, so a read-only directory is fine
+            pass
+    return graph
+
+
+def load_landmarks(directory, graph, count=LANDMARK_COUNT, rebuild=False):
+    """
+    Load the landmark distances for `graph`, the graph of `directory`,
+    from their cache file if it is up to date. Otherwise (or if `rebuild`
+    is set), choose the landmarks again and rewrite the cache.
+    """
+    filename = os.path.join(directory, LANDMARKS_FILENAME)
+    sources = csv_fingerprint(directory)
+    landmarks = None if rebuild else Landmarks.load(filename, sources, count)
+    if landmarks is None:
+        landmarks = Landmarks.choose(graph, count)
+        try:
+            landmarks.save(filename, sources, count)
+        except OSError:
+            pass
+    return landmarks
+
+
+def csv_fingerprint(directory):
+    """
+    Return the [filename, size, mtime] of each CSV file in `directory`.
+    """
+    fingerprint = []
+    for filename in CSV_FILENAMES:
+        stat = os.stat(os.path.join(directory, filename))
+        fingerprint.append([filename, stat.st_size, stat.st_mtime_ns])
+    return fingerprint
+
+
+def write_sections(filename, magic, header, sections):
+    """
+    Write `magic`, a JSON `header` and the named byte strings in `sections`
+    to `filename`, aligning each section to 8 bytes.
+    """
+    layout = {}
+    offset = 0
+    for name, blob in sections.items():
+        layout[name] = [offset, len(blob)]
+        offset += len(blob) + padding(len(blob))
+    header = dict(
+        header,
+        byteorder=sys.byteorder,
+        itemsize=array("i").itemsize,
+        sections=layout
+    )
+    encoded = json.dumps(header).encode("utf-8")
+    encoded += b" " * padding(len(magic) + 4 + len(encoded))
+
+    # Write to a temporary file first so readers never see a partial file
+    temporary = f"{filename}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(magic)
+        f.write(struct.pack("<I", len(encoded)))
+        f.write(encoded)
+        for blob in sections.values():
+            f.write(blob)
+            f.write(bytes(padding(len(blob))))
+    os.replace(temporary, filename)
+
+
+def read_sections(filename, magic):
+    """
+    Memory-map a file written by `write_sections`.
+
+    Returns (header, sections), where each section is a zero-copy
+    memoryview of the file. Returns None if the file is missing or
+    corrupt, or was written on a platform with other integer layouts.
+    """
+    try:
+        with open(filename, "rb") as f:
+            contents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    if contents[:len(magic)] != magic:
+        return None
+    start = len(magic) + 4
+    try:
+        header_length, = struct.unpack("<I", contents[start - 4:start])
+        header = json.loads(contents[start:start + header_length])
+        data = memoryview(contents)[start + header_length:]
+        sections = {
+            name: data[offset:offset + length]
+            for name, (offset, length) in header["sections"].items()
+        }
+    except (struct.error, ValueError, KeyError, TypeError):
+        return None
+    if (header.get("byteorder") != sys.byteorder or
+            header.get("itemsize") != array("i").itemsize):
+        return None
+    return header, sections
+
+
+def read_columns(filename, columns, stats):
+    """
+    Yield the named `columns` of a CSV file as a tuple of value lists,
+    CHUNK_SIZE rows at a time. Non-blank rows too short to have every
+    column are skipped and counted in stats["malformed_rows"].
+    """
+    with open(filename, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        positions = [header.index(column) for column in columns]
+        getters = [operator.itemgetter(position) for position in positions]
+        width = max(positions) + 1
+        while True:
+            rows = list(itertools.islice(reader, CHUNK_SIZE))
+            if not rows:
+                return
+
+            # Only fall back to checking each row if some row is short
+            try:
+                chunk = tuple(list(map(getter, rows)) for getter in getters)
+            except IndexError:
+                complete = [row for row in rows if len(row) >= width]
+                stats["malformed_rows"] += sum(
+                    1 for row in rows if row and len(row) < width
+                )
+                chunk = tuple(list(map(getter, complete)) for getter in getters)
+            yield chunk
+
+
+def padding(length, alignment=8):
+    """
+    Return the number of bytes needed to align `length` to `alignment`.
+    """
+    return -length % alignment
+
+
+def build_csr(n, sources, targets):
+    """
+    Return (offsets, indices) arrays listing the distinct targets of each
+    of the `n` sources, in ascending order.
+    """
+    counts = array("i", [0]) * (n + 1)
+    for source in sources:
+        counts[source + 1] += 1
+    for i in range(n):
+        counts[i + 1] += counts[i]
+
+    # Scatter each edge into its source's row
+    indices = array("i", [0]) * len(sources)
+    position = array("i", counts)
+    for source, target in zip(sources, targets):
+        indices[position[source]] = target
+        position[source] += 1
+
+    # Sort each row and drop duplicate edges
+    offsets = array("i", [0])
+    distinct = array("i")
+    for i in range(n):
+        distinct.extend(sorted(set(indices[counts[i]:counts[i + 1]])))
+        offsets.append(len(distinct))
+    return offsets, distinct
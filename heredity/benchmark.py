@@ -0,0 +1,368 @@
+import argparse
+import copy
+import glob
+import os
+import random
+import time
+from collections import Counter
+
+import numpy as np
+
+from heredity import PROBS, enumerate_probabilities, load_data
+from inference import BATCH_SIZE, GENES, Pedigree, eliminate, inheritance
+from sampling import CHAINS, SAMPLES, sample
+
+# Directory of the example families
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Slack allowed when checking that sampled intervals cover exact results
+COVERAGE = 1e-9
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark heredity inference on real and random families."
+    )
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    check = subparsers.add_parser(
+        "check",
+        help="compare elimination and batched enumeration with enumeration "
+             "on the example families and small random ones"
+    )
+    check.add_argument("--random", type=int, default=50,
+                       help="random families to check")
+    check.add_argument("--people", type=int, default=7,
+                       help="people in each random family")
+    check.add_argument("--seed", type=int, default=0)
+
+    pedigree = subparsers.add_parser(
+        "pedigree",
+        help="time each method on random families of growing size"
+    )
+    pedigree.add_argument("--sizes", default="4,8,12,100,1000,10000",
+                          help="comma-separated numbers of people")
+    pedigree.add_argument("--max-enumerate", type=int, default=12,
+                          help="largest family to enumerate")
+    pedigree.add_argument("--seed", type=int, default=0)
+
+    enumeration = subparsers.add_parser(
+        "enumerate",
+        help="count the gene and trait combinations enumeration evaluates"
+    )
+    enumeration.add_argument("--sizes", default="4,6,8,10,12",
+                             help="comma-separated numbers of people")
+    enumeration.add_argument("--mutation", type=float,
+                             default=PROBS["mutation"],
+                             help="mutation probability to use")
+    enumeration.add_argument("--seed", type=int, default=0)
+
+    joint = subparsers.add_parser(
+        "joint",
+        help="compare joint probability evaluations per second of the "
+             "original one at a time scoring and of batches"
+    )
+    joint.add_argument("-n", "--assignments", type=int, default=1000000,
+                       help="random assignments to score per family")
+    joint.add_argument("--repeat", type=int, default=3,
+                       help="runs to take the fastest of")
+    joint.add_argument("--seed", type=int, default=0)
+
+    sampling = subparsers.add_parser(
+        "sample",
+        help="compare Gibbs sampling with exact results on the example "
+             "families and random ones, and report effective samples per "
+             "second"
+    )
+    sampling.add_argument("--sizes", default="100,500",
+                          help="comma-separated numbers of people in "
+                               "random families")
+    sampling.add_argument("--samples", type=int, default=SAMPLES,
+                          help="sweeps to sample over all chains")
+    sampling.add_argument("--chains", type=int, default=CHAINS)
+    sampling.add_argument("--workers", default="1,2",
+                          help="comma-separated numbers of processes")
+    sampling.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    if args.benchmark == "check":
+        check_methods(args.random, args.people, args.seed)
+    elif args.benchmark == "pedigree":
+        sizes = [int(size) for size in args.sizes.split(",")]
+        benchmark_pedigree(sizes, args.max_enumerate, args.seed)
+    elif args.benchmark == "enumerate":
+        sizes = [int(size) for size in args.sizes.split(",")]
+        benchmark_enumeration(sizes, args.mutation, args.seed)
+    elif args.benchmark == "joint":
+        benchmark_joint(args.assignments, args.repeat, args.seed)
+    elif args.benchmark == "sample":
+        sizes = [int(size) for size in args.sizes.split(",")]
+        workers = [int(count) for count in args.workers.split(",")]
+        benchmark_sampling(sizes, args.samples, args.chains, workers, args.seed)
+
+
+def random_family(size, rng, known=0.5):
+    """
+    Return a random family of `size` people in the form `load_data`
+    returns, with genes and traits drawn from PROBS and each trait
+    known with probability `known`.
+
+    Everyone is either a founder without parents, or a child of a
+    couple made of an earlier person and a founder, so there are no
+    marriages between relatives.
+    """
+    people = {}
+    genes = {}
+    couples = []
+    for i in range(size):
+        name = f"P{i}"
+        if couples and rng.random() < 0.6:
+            mother, father = rng.choice(couples)
+            genes[name] = rng.choices(
+                GENES, inheritance(genes[mother], genes[father], PROBS)
+            )[0]
+        else:
+            mother = father = None
+            genes[name] = rng.choices(
+                GENES, [PROBS["gene"][count] for count in GENES]
+            )[0]
+
+            # Marry the founder to someone already in the family
+            if people:
+                spouse = rng.choice(list(people))
+                couples.append((name, spouse) if rng.random() < 0.5
+                               else (spouse, name))
+        trait = rng.random() < PROBS["trait"][genes[name]][True]
+        people[name] = {
+            "name": name,
+            "mother": mother,
+            "father": father,
+            "trait": trait if rng.random() < known else None,
+        }
+    return people
+
+
+def largest_difference(a, b):
+    """
+    Return the largest difference between two sets of probabilities in
+    the form `heredity.main` prints.
+    """
+    return max(
+        abs(a[person][field][value] - b[person][field][value])
+        for person in a
+        for field in a[person]
+        for value in a[person][field]
+    )
+
+
+def check_methods(families, size, seed):
+    rng = random.Random(seed)
+    print("Against enumeration (largest difference)")
+    print(f"  {'family':<24} {'eliminate':>9} {'batch':>9}")
+    rows = [
+        (os.path.basename(filename), [load_data(filename)])
+        for filename in sorted(glob.glob(os.path.join(DATA, "*.csv")))
+    ]
+    if families:
+        rows.append((
+            f"{families} random of {size}",
+            [random_family(size, rng) for _ in range(families)]
+        ))
+    worst = 0
+    for label, group in rows:
+        eliminated = batched = 0
+        for people in group:
+            expected = enumerate_probabilities(people)
+            eliminated = max(eliminated, largest_difference(
+                eliminate(people, PROBS), expected
+            ))
+            batched = max(batched, largest_difference(
+                Pedigree(people, PROBS).probabilities(), expected
+            ))
+        worst = max(worst, eliminated, batched)
+        print(f"  {label:<24} {eliminated:9.1e} {batched:9.1e}")
+    print("OK" if worst < 1e-9 else "MISMATCH")
+
+
+def benchmark_pedigree(sizes, max_enumerate, seed):
+    print("Pedigree benchmark")
+    print(f"  {'people':>6}  {'eliminate':>10}  {'enumerate':>10}  {'batch':>10}")
+    for size in sizes:
+        people = random_family(size, random.Random(seed))
+        start = time.perf_counter()
+        eliminate(people, PROBS)
+        eliminated = time.perf_counter() - start
+        enumerated = batched = f"{'-':>10}"
+        if size <= max_enumerate:
+            start = time.perf_counter()
+            enumerate_probabilities(people)
+            enumerated = f"{time.perf_counter() - start:9.3f}s"
+            start = time.perf_counter()
+            Pedigree(people, PROBS).probabilities()
+            batched = f"{time.perf_counter() - start:9.3f}s"
+        print(f"  {size:6}  {eliminated:9.3f}s  {enumerated}  {batched}")
+
+
+def benchmark_enumeration(sizes, mutation, seed):
+    probs = copy.deepcopy(PROBS)
+    probs["mutation"] = mutation
+    families = [
+        (os.path.basename(filename), load_data(filename))
+        for filename in sorted(glob.glob(os.path.join(DATA, "*.csv")))
+    ] + [
+        (f"random {size}", random_family(size, random.Random(seed)))
+        for size in sizes
+    ]
+
+    print(f"Enumeration benchmark (mutation {mutation})")
+    print(f"  {'family':<16} {'naive':>12} {'evaluated':>10} {'pruned':>8} "
+          f"{'time':>9}")
+    for label, people in families:
+        # The naive enumeration evaluated every gene assignment for every
+        # set of traits consistent with the known ones
+        unknown = sum(data["trait"] is None for data in people.values())
+        naive = 2 ** unknown * 3 ** len(people)
+        counts = Counter()
+        start = time.perf_counter()
+        enumerate_probabilities(people, probs, counts)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<16} {naive:12,} {counts['assignments']:10,} "
+              f"{counts['pruned']:8,} {elapsed:8.3f}s")
+
+
+def original_joint_probability(people, one_gene, two_genes, have_trait):
+    """
+    Return the joint probability of the given gene counts and traits, as
+    the original `heredity.joint_probability` computed it, one person at
+    a time from the PROBS dictionaries. Batched scoring is measured
+    against this, rather than the current `joint_probability`.
+    """
+    probability = 1
+    for person in people:
+        mother = people[person]['mother']
+        father = people[person]['father']
+
+        # Determine number of genes
+        if person in two_genes:
+            gene_count = 2
+        elif person in one_gene:
+            gene_count = 1
+        else:
+            gene_count = 0
+
+        # Probability of gene
+        if mother is None and father is None:
+            gene_prob = PROBS['gene'][gene_count]
+        else:
+            # Probabilities parent passes gene
+            def pass_prob(parent):
+                if parent in two_genes:
+                    return 1 - PROBS['mutation']
+                elif parent in one_gene:
+                    return 0.5
+                else:
+                    return PROBS['mutation']
+
+            mom_prob = pass_prob(mother)
+            dad_prob = pass_prob(father)
+
+            if gene_count == 2:
+                gene_prob = mom_prob * dad_prob
+            elif gene_count == 1:
+                gene_prob = mom_prob * (1 - dad_prob) + (1 - mom_prob) * dad_prob
+            else:
+                gene_prob = (1 - mom_prob) * (1 - dad_prob)
+
+        # Probability of trait
+        trait_prob = PROBS['trait'][gene_count][person in have_trait]
+
+        probability *= gene_prob * trait_prob
+
+    return probability
+
+
+def benchmark_joint(assignments, repeat, seed):
+    rng = np.random.default_rng(seed)
+    print(f"Joint probability benchmark (evaluations per second, fastest "
+          f"of {repeat})")
+    print(f"  {'family':<16} {'one at a time':>14} {'batched':>14} "
+          f"{'speedup':>8} {'difference':>10}")
+    for filename in sorted(glob.glob(os.path.join(DATA, "*.csv"))):
+        people = load_data(filename)
+        pedigree = Pedigree(people, PROBS)
+        genes = rng.integers(3, size=(assignments, len(people)))
+        traits = rng.integers(2, size=(assignments, len(people)))
+
+        # One at a time, on a sample of the assignments as sets
+        sample = min(assignments, 20000)
+        calls = []
+        for row, have in zip(genes[:sample].tolist(), traits[:sample].tolist()):
+            calls.append((
+                {name for name, count in zip(pedigree.names, row) if count == 1},
+                {name for name, count in zip(pedigree.names, row) if count == 2},
+                {name for name, has in zip(pedigree.names, have) if has},
+            ))
+
+        # The fastest of `repeat` runs of each
+        scalar = batched = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            expected = [
+                original_joint_probability(people, *call) for call in calls
+            ]
+            scalar = max(scalar, sample / (time.perf_counter() - start))
+
+            start = time.perf_counter()
+            scored = [
+                pedigree.joint_probabilities(
+                    genes[first:first + BATCH_SIZE],
+                    traits[first:first + BATCH_SIZE]
+                )
+                for first in range(0, assignments, BATCH_SIZE)
+            ]
+            batched = max(batched, assignments / (time.perf_counter() - start))
+        difference = np.abs(np.concatenate(scored)[:sample] - expected).max()
+        print(f"  {os.path.basename(filename):<16} {scalar:14,.0f} "
+              f"{batched:14,.0f} {batched / scalar:7.0f}x {difference:10.1e}")
+
+
+def benchmark_sampling(sizes, samples, chains, workers, seed):
+    families = [
+        (os.path.basename(filename), load_data(filename))
+        for filename in sorted(glob.glob(os.path.join(DATA, "*.csv")))
+    ] + [
+        (f"random {size}", random_family(size, random.Random(seed)))
+        for size in sizes
+    ]
+
+    # Elimination is exact, and fast on families without marriages
+    # between relatives, so it checks the sampler on large ones too
+    print(f"Sampling benchmark ({samples:,} sweeps in {chains} chains)")
+    print(f"  {'family':<16} {'workers':>7} {'difference':>10} "
+          f"{'covered':>8} {'time':>8} {'ESS':>8} {'ESS/s':>8}")
+    for label, people in families:
+        expected = eliminate(people, PROBS)
+        for count in workers:
+            estimates, intervals, stats = sample(
+                people, PROBS, samples, chains, seed=seed, workers=count
+            )
+
+            # Share of the 95% intervals containing the exact probability,
+            # up to rounding and probabilities too small for the chains
+            # to visit the states behind them
+            checks = [
+                low - COVERAGE <= expected[person][field][value] <= high + COVERAGE
+                for person in people
+                for field in intervals[person]
+                for value, (low, high) in intervals[person][field].items()
+            ]
+            print(f"  {label:<16} {count:7} "
+                  f"{largest_difference(estimates, expected):10.1e} "
+                  f"{sum(checks) / len(checks):8.1%} "
+                  f"{stats['seconds']:7.2f}s {stats['effective']:8,.0f} "
+                  f"{stats['per_second']:8,.0f}")
+
+
+if __name__ == "__main__":
+    main()
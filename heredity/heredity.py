@@ -1,7 +1,11 @@
+import argparse
 import csv
 import itertools
 import sys
 
+from inference import GENES, Pedigree, eliminate, inheritance
+from sampling import CHAINS, SAMPLES, sample
+
 PROBS = {
 
     # Unconditional probabilities for having gene
@@ -36,11 +40,73 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Ways to compute each person's probabilities: exactly by variable
+# elimination on a junction tree, or by enumerating every combination,
+# one at a time or in vectorized batches, or approximately by sampling
+EXACT_METHODS = ["eliminate", "enumerate", "batch"]
+METHODS = EXACT_METHODS + ["sample"]
+
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
-    people = load_data(sys.argv[1])
+    parser = argparse.ArgumentParser(
+        description="Infer the probability that each person in a family "
+                    "has the gene and the trait."
+    )
+    parser.add_argument("data", help="CSV file of the family")
+    parser.add_argument("--method", choices=METHODS, default="eliminate",
+                        help="how to compute the probabilities "
+                             "(default: eliminate)")
+    parser.add_argument("--samples", type=int, default=SAMPLES,
+                        help="sweeps to sample over all chains "
+                             f"(default: {SAMPLES})")
+    parser.add_argument("--chains", type=int, default=CHAINS,
+                        help=f"chains to sample (default: {CHAINS})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes to run the chains in (default: 1)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for sampling")
+    args = parser.parse_args()
+    if args.samples < 1 or args.chains < 1 or args.workers < 1:
+        sys.exit("Samples, chains and workers must be positive")
+    people = load_data(args.data)
 
+    intervals = None
+    if args.method == "sample":
+        try:
+            probabilities, intervals, stats = sample(
+                people, PROBS, args.samples, args.chains, seed=args.seed,
+                workers=args.workers
+            )
+        except ValueError as e:
+            sys.exit(e)
+    else:
+        probabilities = infer(people, args.method)
+
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                if intervals is None:
+                    print(f"    {value}: {p:.4f}")
+                else:
+                    low, high = intervals[person][field][value]
+                    print(f"    {value}: {p:.4f} ({low:.4f}-{high:.4f})")
+    if intervals is not None:
+        print(f"Effective sample size: {stats['effective']:,.0f} "
+              f"({stats['per_second']:,.0f} per second)")
+
+def infer(people, method="eliminate", probs=PROBS):
+
+    # Computes everyone's probabilities by one of the EXACT_METHODS
+    if method == "eliminate":
+        return eliminate(people, probs)
+    elif method == "batch":
+        return Pedigree(people, probs).probabilities()
+    else:
+        return enumerate_probabilities(people, probs)
+
+def enumerate_probabilities(people, probs=PROBS, counts=None):
     probabilities = {
         person: {
             "gene": {2: 0, 1: 0, 0: 0},
@@ -49,30 +115,72 @@ def main():
         for person in people
     }
 
-    names = set(people)
-    for have_trait in powerset(names):
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
-
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+    # Unknown traits are independent given the genes, so rather than
+    # enumerating them, each gene assignment adds its probability to
+    # both values of an unknown trait, split by how likely each is
+    for genes, p in gene_assignments(people, probs, counts):
+        for person, count in genes.items():
+            probabilities[person]["gene"][count] += p
+            trait = people[person]["trait"]
+            if trait is None:
+                for value in (True, False):
+                    probabilities[person]["trait"][value] += (
+                        p * probs["trait"][count][value]
+                    )
+            else:
+                probabilities[person]["trait"][trait] += p
 
     normalize(probabilities)
+    return probabilities
+
+def gene_assignments(people, probs=PROBS, counts=None):
 
+    # Yields each assignment of gene counts that could explain the known
+    # traits, with its joint probability with them. People are assigned
+    # counts parents first, multiplying in the probability of each count
+    # and known trait as it is chosen, so a partial assignment with
+    # probability 0 is abandoned with every assignment extending it
+    order = []
+    placed = set()
+    def place(person):
+        if person in placed or person not in people:
+            return
+        placed.add(person)
+        place(people[person]["mother"])
+        place(people[person]["father"])
+        order.append(person)
     for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+        place(person)
+
+    genes = {}
+    def extend(i, p):
+        if i == len(order):
+            if counts is not None:
+                counts["assignments"] += 1
+            yield dict(genes), p
+            return
+        person = order[i]
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        for count in GENES:
+            if mother is None and father is None:
+                q = p * probs["gene"][count]
+            else:
+                q = p * inheritance(
+                    genes.get(mother, 0), genes.get(father, 0), probs
+                )[count]
+            trait = people[person]["trait"]
+            if trait is not None:
+                q *= probs["trait"][count][trait]
+            if q == 0:
+                if counts is not None:
+                    counts["pruned"] += 1
+                continue
+            genes[person] = count
+            yield from extend(i + 1, q)
+        genes.pop(person, None)
+
+    yield from extend(0, 1)
 
 def load_data(filename):
     data = dict()
@@ -91,41 +199,23 @@ def load_data(filename):
 
 def powerset(s):
     s = list(s)
-    return [
-        set(s) for s in itertools.chain.from_iterable(
-            itertools.combinations(s, r) for r in range(len(s) + 1)
-        )
-    ]
+    for r in range(len(s) + 1):
+        for subset in itertools.combinations(s, r):
+            yield set(subset)
 
 def joint_probability(people, one_gene, two_genes, have_trait):
     probability = 1
-    for person in people:
-        mother = people[person]['mother']
-        father = people[person]['father']
-
-        # Determine number of genes
-        if person in two_genes:
-            gene_count = 2
-        elif person in one_gene:
-            gene_count = 1
-        else:
-            gene_count = 0
+    for person, data in people.items():
+        mother = data['mother']
+        father = data['father']
+        gene_count = genes_of(person, one_gene, two_genes)
 
         # Probability of gene
         if mother is None and father is None:
             gene_prob = PROBS['gene'][gene_count]
         else:
-            # Probabilities parent passes gene
-            def pass_prob(parent):
-                if parent in two_genes:
-                    return 1 - PROBS['mutation']
-                elif parent in one_gene:
-                    return 0.5
-                else:
-                    return PROBS['mutation']
-
-            mom_prob = pass_prob(mother)
-            dad_prob = pass_prob(father)
+            mom_prob = pass_prob(mother, one_gene, two_genes)
+            dad_prob = pass_prob(father, one_gene, two_genes)
 
             if gene_count == 2:
                 gene_prob = mom_prob * dad_prob
@@ -141,14 +231,26 @@ def joint_probability(people, one_gene, two_genes, have_trait):
 
     return probability
 
+def genes_of(person, one_gene, two_genes):
+    if person in two_genes:
+        return 2
+    elif person in one_gene:
+        return 1
+    else:
+        return 0
+
+# Probability a parent passes the gene on to a child
+def pass_prob(parent, one_gene, two_genes):
+    if parent in two_genes:
+        return 1 - PROBS['mutation']
+    elif parent in one_gene:
+        return 0.5
+    else:
+        return PROBS['mutation']
+
 def update(probabilities, one_gene, two_genes, have_trait, p):
     for person in probabilities:
-        if person in two_genes:
-            gene = 2
-        elif person in one_gene:
-            gene = 1
-        else:
-            gene = 0
+        gene = genes_of(person, one_gene, two_genes)
         probabilities[person]['gene'][gene] += p
         probabilities[person]['trait'][person in have_trait] += p
 
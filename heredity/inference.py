@@ -0,0 +1,447 @@
+import heapq
+import itertools
+
+import numpy as np
+
+# Copies of the gene a person can have, the values of every variable
+GENES = (0, 1, 2)
+
+# Gene assignments scored at a time by `Pedigree.probabilities`. Small
+# enough for each batch's arrays to stay in cache
+BATCH_SIZE = 1 << 13
+
+
+class Factor():
+    """
+    A function of some people's gene counts, as a table mapping each
+    assignment of counts to `variables`, in order, to a value.
+    """
+
+    def __init__(self, variables, table):
+        self.variables = tuple(variables)
+        self.table = table
+
+    @classmethod
+    def ones(cls, variables):
+        """
+        Return the factor over `variables` that is 1 everywhere.
+        """
+        return cls(variables, dict.fromkeys(
+            itertools.product(GENES, repeat=len(variables)), 1.0
+        ))
+
+    def multiply(self, other):
+        """
+        Return the product of this factor and `other`, over the union of
+        their variables.
+        """
+        variables = self.variables + tuple(
+            v for v in other.variables if v not in self.variables
+        )
+        mine = [variables.index(v) for v in self.variables]
+        theirs = [variables.index(v) for v in other.variables]
+        table = {}
+        for assignment in itertools.product(GENES, repeat=len(variables)):
+            table[assignment] = (
+                self.table[tuple(assignment[i] for i in mine)] *
+                other.table[tuple(assignment[i] for i in theirs)]
+            )
+        return Factor(variables, table)
+
+    def sum_out(self, keep):
+        """
+        Return this factor summed over every variable not in `keep`.
+        """
+        variables = tuple(v for v in self.variables if v in keep)
+        positions = [self.variables.index(v) for v in variables]
+        table = dict.fromkeys(
+            itertools.product(GENES, repeat=len(variables)), 0.0
+        )
+        for assignment, value in self.table.items():
+            table[tuple(assignment[i] for i in positions)] += value
+        return Factor(variables, table)
+
+    def normalized(self):
+        """
+        Return this factor scaled so its values sum to 1, or unchanged if
+        they sum to 0.
+        """
+        total = sum(self.table.values())
+        if not total:
+            return self
+        return Factor(self.variables, {
+            assignment: value / total for assignment, value in self.table.items()
+        })
+
+
+def pedigree_factors(people, probs):
+    """
+    Return the factors whose product is the joint probability of every
+    person's gene count and the traits observed in `people`, a dictionary
+    as returned by `load_data`, under the model `probs` (see PROBS).
+
+    Each person has a factor for their gene count given their parents'
+    counts, or the unconditional probability if they have no parents.
+    Like `joint_probability`, a parent who is not in `people` passes the
+    gene on only by mutation. A known trait adds a factor for how likely
+    it is given the person's gene count; unknown traits sum to 1 and
+    need no factor.
+    """
+    factors = []
+    for person, data in people.items():
+        parents = [data["mother"], data["father"]]
+        if parents == [None, None]:
+            factors.append(Factor([person], {
+                (genes,): probs["gene"][genes] for genes in GENES
+            }))
+        else:
+            known = [parent for parent in parents if parent in people]
+            table = {}
+            for assignment in itertools.product(GENES, repeat=len(known) + 1):
+                counts = dict(zip(known, assignment[1:]))
+                table[assignment] = inheritance(
+                    counts.get(parents[0], 0), counts.get(parents[1], 0), probs
+                )[assignment[0]]
+            factors.append(Factor([person] + known, table))
+
+        if data["trait"] is not None:
+            factors.append(Factor([person], {
+                (genes,): probs["trait"][genes][data["trait"]]
+                for genes in GENES
+            }))
+    return factors
+
+
+def inheritance(mother, father, probs):
+    """
+    Return the probability of a child having each gene count, as a tuple
+    indexed by count, if their parents have `mother` and `father` copies.
+    """
+    def pass_prob(genes):
+        if genes == 2:
+            return 1 - probs["mutation"]
+        elif genes == 1:
+            return 0.5
+        else:
+            return probs["mutation"]
+
+    mom_prob = pass_prob(mother)
+    dad_prob = pass_prob(father)
+    return (
+        (1 - mom_prob) * (1 - dad_prob),
+        mom_prob * (1 - dad_prob) + (1 - mom_prob) * dad_prob,
+        mom_prob * dad_prob,
+    )
+
+
+def elimination_order(factors):
+    """
+    Return an order to eliminate the variables of `factors` in, greedily
+    picking the variable whose elimination adds the fewest new edges
+    between the remaining variables, breaking ties by fewest neighbors.
+
+    For a pedigree without marriages between relatives this eliminates
+    people from the leaves in, so no clique has more than a few people.
+    """
+    neighbors = {}
+    for factor in factors:
+        for v in factor.variables:
+            neighbors.setdefault(v, set()).update(factor.variables)
+    for v in neighbors:
+        neighbors[v].discard(v)
+
+    def fill(v):
+        return sum(
+            1 for a, b in itertools.combinations(neighbors[v], 2)
+            if b not in neighbors[a]
+        )
+
+    # Scores only change near an eliminated variable, so stale heap
+    # entries are skipped rather than every score recomputed each step
+    scores = {v: (fill(v), len(neighbors[v]), v) for v in neighbors}
+    heap = list(scores.values())
+    heapq.heapify(heap)
+    order = []
+    while heap:
+        score = heapq.heappop(heap)
+        v = score[2]
+        if scores.get(v) != score:
+            continue
+        for a, b in itertools.combinations(neighbors[v], 2):
+            neighbors[a].add(b)
+            neighbors[b].add(a)
+        for u in neighbors[v]:
+            neighbors[u].discard(v)
+        affected = set(neighbors[v])
+        for u in neighbors[v]:
+            affected.update(neighbors[u])
+        del neighbors[v]
+        del scores[v]
+        order.append(v)
+        for u in affected:
+            score = (fill(u), len(neighbors[u]), u)
+            if score != scores[u]:
+                scores[u] = score
+                heapq.heappush(heap, score)
+    return order
+
+
+class Pedigree():
+    """
+    A family compiled to arrays, so batches of gene and trait assignments
+    can be scored in a few vectorized operations.
+
+    People are numbered in the order of `people`, a dictionary as
+    returned by `load_data`. Assignments are arrays with a row per
+    assignment and a column per person.
+    """
+
+    def __init__(self, people, probs):
+        self.names = list(people)
+        index = {name: i for i, name in enumerate(self.names)}
+        n = len(self.names)
+
+        # Known traits as 1 or 0, and -1 where unknown
+        self.traits = np.array([
+            -1 if people[name]["trait"] is None else int(people[name]["trait"])
+            for name in self.names
+        ], dtype=np.intp)
+        self.trait = np.array([
+            [probs["trait"][genes][False], probs["trait"][genes][True]]
+            for genes in GENES
+        ])
+
+        # tables[i, mother, father, genes, trait] is the probability of
+        # person `i` having `genes` copies and the trait or not, given
+        # their parents' counts, and evidence[i, mother, father, genes]
+        # the same with only their known trait, if any. A parent who is
+        # not in the family passes the gene on only by mutation, as if
+        # they had no copies
+        self.tables = np.zeros((n, 3, 3, 3, 2))
+        self.evidence = np.zeros((n, 3, 3, 3))
+
+        # The position of each person's entry in the flattened tables is
+        # a linear function of the gene counts and traits, found for a
+        # whole batch by one matrix product: 18 times the mother's count,
+        # plus 6 times the father's, twice the person's own and the trait.
+        # The product is in single precision, which holds these small
+        # integers exactly, as NumPy multiplies integer matrices without
+        # BLAS and several times slower
+        self.weights = np.zeros((n, n), dtype=np.float32)
+        for i, name in enumerate(self.names):
+            mother = people[name]["mother"]
+            father = people[name]["father"]
+            for m, f, genes in itertools.product(GENES, repeat=3):
+                if mother is None and father is None:
+                    gene_prob = probs["gene"][genes]
+                else:
+                    gene_prob = inheritance(
+                        m if mother in index else 0,
+                        f if father in index else 0,
+                        probs
+                    )[genes]
+                self.tables[i, m, f, genes] = gene_prob * self.trait[genes]
+                self.evidence[i, m, f, genes] = gene_prob * (
+                    1 if self.traits[i] < 0 else self.trait[genes, self.traits[i]]
+                )
+            if mother in index:
+                self.weights[index[mother], i] += 18
+            if father in index:
+                self.weights[index[father], i] += 6
+            self.weights[i, i] += 2
+        self.tables = self.tables.ravel()
+        self.evidence = self.evidence.ravel()
+        self.offsets = np.arange(n) * 54
+
+    def joint_probabilities(self, genes, traits):
+        """
+        Return the joint probability of each assignment of gene counts in
+        `genes` and traits in `traits`, like `joint_probability`.
+        """
+        positions = self.positions(genes)
+        positions += traits
+        positions += self.offsets
+        return product(np.take(self.tables, positions))
+
+    def positions(self, genes):
+        """
+        Return each person's position in the tables for each assignment of
+        gene counts in `genes`, before adding their offset and trait.
+        """
+        positions = np.asarray(genes, dtype=np.float32) @ self.weights
+        return positions.astype(np.intp)
+
+    def evidence_probabilities(self, genes):
+        """
+        Return the joint probability of each assignment of gene counts in
+        `genes` and the known traits.
+        """
+        positions = self.positions(genes)
+        positions += self.offsets
+        positions //= 2
+        return product(np.take(self.evidence, positions))
+
+    def probabilities(self):
+        """
+        Return the probability of each person having each gene count and
+        having the trait, given the known traits, in the form
+        `heredity.main` prints, by scoring all 3 ** n gene assignments
+        BATCH_SIZE at a time. Unknown traits are summed out, as they are
+        independent given the genes.
+        """
+        n = len(self.names)
+        powers = 3 ** np.arange(n, dtype=np.int64)
+        gene_totals = np.zeros((n, len(GENES)))
+        trait_totals = np.zeros(n)
+        for start in range(0, 3 ** n, BATCH_SIZE):
+            codes = np.arange(start, min(start + BATCH_SIZE, 3 ** n))
+            genes = (codes[:, None] // powers % 3).astype(np.intp)
+            likelihoods = self.evidence_probabilities(genes)
+            for count in GENES:
+                gene_totals[:, count] += likelihoods @ (genes == count)
+            trait_totals += likelihoods @ self.trait[genes, 1]
+
+        total = gene_totals[0].sum() if n else 1
+        gene_totals /= total
+        trait_totals /= total
+        probabilities = {}
+        for i, name in enumerate(self.names):
+            has_trait = (
+                trait_totals[i] if self.traits[i] < 0 else float(self.traits[i])
+            )
+            probabilities[name] = {
+                "gene": {count: float(gene_totals[i, count]) for count in (2, 1, 0)},
+                "trait": {True: float(has_trait), False: float(1 - has_trait)},
+            }
+        return probabilities
+
+
+def product(values):
+    """
+    Return the product of each row of the 2-dimensional array `values`.
+    Families have few people, and multiplying their columns together is
+    several times faster than reducing each short row.
+    """
+    result = values[:, 0].copy() if values.shape[1] else np.ones(len(values))
+    for column in range(1, values.shape[1]):
+        result *= values[:, column]
+    return result
+
+
+class JunctionTree():
+    """
+    A junction tree (clique tree) over the variables of a list of factors,
+    built by eliminating the variables in `elimination_order`.
+
+    Eliminating variable `v` makes a clique of `v` and its neighbors at
+    that point, whose parent is the clique of the first of those
+    neighbors eliminated after it. Each factor is assigned to the clique
+    of the first of its variables to be eliminated, which contains all
+    of them. Pedigrees split into separate families give a forest.
+    """
+
+    def __init__(self, factors):
+        order = elimination_order(factors)
+        position = {v: i for i, v in enumerate(order)}
+
+        neighbors = {v: set() for v in order}
+        for factor in factors:
+            for v in factor.variables:
+                neighbors[v].update(u for u in factor.variables if u != v)
+
+        # Clique `i` is made by eliminating `order[i]`
+        self.cliques = []
+        self.parents = []
+        for v in order:
+            clique = (v,) + tuple(sorted(neighbors[v], key=position.get))
+            self.cliques.append(clique)
+            self.parents.append(position[clique[1]] if len(clique) > 1 else None)
+            for u in neighbors[v]:
+                neighbors[u].update(w for w in neighbors[v] if w != u)
+                neighbors[u].discard(v)
+        self.children = [[] for _ in self.cliques]
+        for i, parent in enumerate(self.parents):
+            if parent is not None:
+                self.children[parent].append(i)
+        self.clique_of = position
+
+        self.potentials = [Factor.ones(clique) for clique in self.cliques]
+        for factor in factors:
+            i = min(position[v] for v in factor.variables)
+            self.potentials[i] = self.potentials[i].multiply(factor)
+        self.beliefs = None
+
+    def calibrate(self):
+        """
+        Pass messages up the tree and back down, so each clique's belief
+        is proportional to the marginal of its variables given the
+        evidence. Messages are normalized, as only the proportions matter.
+        """
+        upward = [None] * len(self.cliques)
+        for i, clique in enumerate(self.cliques):
+            if self.parents[i] is None:
+                continue
+            product = self.potentials[i]
+            for child in self.children[i]:
+                product = product.multiply(upward[child])
+            upward[i] = product.sum_out(clique[1:]).normalized()
+
+        downward = [None] * len(self.cliques)
+        self.beliefs = [None] * len(self.cliques)
+        for i in reversed(range(len(self.cliques))):
+            incoming = [upward[child] for child in self.children[i]]
+            if downward[i] is not None:
+                incoming.append(downward[i])
+            belief = self.potentials[i]
+            for message in incoming:
+                belief = belief.multiply(message)
+            self.beliefs[i] = belief.normalized()
+
+            # The message to each child leaves out what it sent up
+            for child in self.children[i]:
+                product = self.potentials[i]
+                for message in incoming:
+                    if message is not upward[child]:
+                        product = product.multiply(message)
+                downward[child] = product.sum_out(
+                    self.cliques[child][1:]
+                ).normalized()
+
+    def marginal(self, variable):
+        """
+        Return the probability of each gene count of `variable` given the
+        evidence, as a dictionary, calibrating the tree if needed.
+        """
+        if self.beliefs is None:
+            self.calibrate()
+        factor = self.beliefs[self.clique_of[variable]].sum_out([variable])
+        factor = factor.normalized()
+        return {genes: factor.table[(genes,)] for genes in GENES}
+
+
+def eliminate(people, probs):
+    """
+    Return the probability of each person in `people` having each gene
+    count and having the trait, given the known traits, in the form
+    `heredity.main` prints.
+
+    This is exact, like enumerating every assignment, but takes time
+    linear in the number of people for pedigrees whose junction tree
+    has small cliques, such as any family tree without marriages between
+    relatives.
+    """
+    tree = JunctionTree(pedigree_factors(people, probs))
+    probabilities = {}
+    for person, data in people.items():
+        genes = tree.marginal(person)
+        if data["trait"] is None:
+            has_trait = sum(
+                genes[count] * probs["trait"][count][True] for count in GENES
+            )
+        else:
+            has_trait = 1.0 if data["trait"] else 0.0
+        probabilities[person] = {
+            "gene": {count: genes[count] for count in (2, 1, 0)},
+            "trait": {True: has_trait, False: 1 - has_trait},
+        }
+    return probabilities
@@ -0,0 +1,173 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from heredity import EXACT_METHODS, infer, load_data
+
+# Families are packed into tasks of up to this many people, so small
+# families share the cost of a task and large ones run alone
+TASK_PEOPLE = 200
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Infer the probabilities of everyone in many families, "
+                    "in parallel, as JSON lines."
+    )
+    parser.add_argument("paths", nargs="+",
+                        help="family CSV files, directories of them or glob "
+                             "patterns")
+    parser.add_argument("--method", choices=EXACT_METHODS, default="eliminate",
+                        help="how to compute the probabilities "
+                             "(default: eliminate)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes to run (default: one per CPU)")
+    parser.add_argument("--task-people", type=int, default=TASK_PEOPLE,
+                        help="people to pack into each task "
+                             f"(default: {TASK_PEOPLE})")
+    parser.add_argument("-o", "--output",
+                        help="file to write the JSON lines to "
+                             "(default: standard output)")
+    args = parser.parse_args()
+    if args.workers < 1 or args.task_people < 1:
+        sys.exit("Workers and task people must be positive")
+
+    filenames = family_files(args.paths)
+    if not filenames:
+        sys.exit("No family CSV files found")
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        stats = run(filenames, args.method, args.workers, args.task_people,
+                    output)
+    finally:
+        if args.output:
+            output.close()
+
+    seconds = stats["seconds"]
+    print(f"Scored {stats['families']:,} families ({stats['people']:,} people, "
+          f"{stats['errors']:,} errors) in {seconds:.2f}s: "
+          f"{stats['families'] / seconds:,.1f} families/s, "
+          f"{stats['people'] / seconds:,.0f} people/s", file=sys.stderr)
+
+
+def family_files(paths):
+    """
+    Return the sorted family CSV files named by `paths`, each a file, a
+    directory whose CSV files are all included, or a glob pattern.
+    """
+    filenames = set()
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.update(glob.glob(os.path.join(path, "*.csv")))
+        elif os.path.isfile(path):
+            filenames.add(path)
+        else:
+            matches = glob.glob(path)
+            if not matches:
+                sys.exit(f"No such file, directory or pattern: {path}")
+            filenames.update(match for match in matches if os.path.isfile(match))
+    return sorted(filenames)
+
+
+def family_size(filename):
+    """
+    Return the number of people in a family CSV, one per line after the
+    header, without parsing it.
+    """
+    with open(filename, "rb") as f:
+        return max(0, sum(1 for _ in f) - 1)
+
+
+def plan_tasks(filenames, task_people=TASK_PEOPLE):
+    """
+    Split `filenames` into tasks, lists of families of up to `task_people`
+    people in all, or a single larger family.
+
+    Tasks are made largest families first, so the largest start first and
+    the many small tasks left fill in around them, rather than one large
+    family starting last and stalling the end of the run.
+    """
+    sizes = sorted(
+        ((family_size(filename), filename) for filename in filenames),
+        key=lambda item: -item[0]
+    )
+    tasks = []
+    task = []
+    people = 0
+    for size, filename in sizes:
+        if task and people + size > task_people:
+            tasks.append(task)
+            task = []
+            people = 0
+        task.append(filename)
+        people += size
+    if task:
+        tasks.append(task)
+    return tasks
+
+
+def score_families(filenames, method):
+    """
+    Compute the probabilities of everyone in each family of `filenames`
+    by `method`. Returns a list of (filename, records) pairs, with a
+    record for each person, or a single error record if the family could
+    not be scored.
+    """
+    results = []
+    for filename in filenames:
+        try:
+            people = load_data(filename)
+            probabilities = infer(people, method)
+        except (OSError, KeyError, ValueError, csv.Error) as e:
+            results.append((filename, [{"family": filename, "error": repr(e)}]))
+            continue
+        results.append((filename, [
+            {"family": filename, "person": person, **probabilities[person]}
+            for person in people
+        ]))
+    return results
+
+
+def run(filenames, method, workers, task_people, output):
+    """
+    Score every family in `filenames` in `workers` processes, writing a
+    JSON line per person to `output` as each task finishes. Returns a
+    dictionary of the numbers of "families", "people" and "errors", and
+    the "seconds" taken.
+    """
+    start = time.perf_counter()
+    tasks = plan_tasks(filenames, task_people)
+    stats = {"families": 0, "people": 0, "errors": 0}
+
+    def write(results):
+        for filename, records in results:
+            stats["families"] += 1
+            for record in records:
+                if "error" in record:
+                    stats["errors"] += 1
+                else:
+                    stats["people"] += 1
+                output.write(json.dumps(record) + "\n")
+        output.flush()
+
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [
+                executor.submit(score_families, task, method) for task in tasks
+            ]
+            for future in as_completed(futures):
+                write(future.result())
+    else:
+        for task in tasks:
+            write(score_families(task, method))
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+if __name__ == "__main__":
+    main()
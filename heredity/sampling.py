@@ -0,0 +1,299 @@
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from inference import GENES, inheritance
+
+# Default sample budget: sweeps counted over all chains after burn-in
+SAMPLES = 10000
+
+# Chains run by default, and sweeps each makes before it is counted
+CHAINS = 8
+BURN_IN = 100
+
+# Each chain's sweeps are split into this many batches, whose means
+# give the standard errors of the estimates (the batch means method)
+BATCHES = 10
+
+# Confidence of the intervals reported, as a number of standard errors
+Z_95 = 1.96
+
+# Standard errors below this are rounding in estimates that do not vary,
+# such as those of people without relatives or evidence
+ROUNDING = 1e-12
+
+
+class GibbsSampler():
+    """
+    A blocked Gibbs sampler over the gene counts of a family, in the form
+    `load_data` returns, under the model `probs` (see PROBS).
+
+    People are split into classes none of whom share a factor (see
+    `color_classes`), so everyone in a class can be resampled at once
+    from their conditional distribution given everyone else. Each update
+    is vectorized over the people in the class and over many chains.
+    """
+
+    def __init__(self, people, probs):
+        self.names = list(people)
+        index = {name: i for i, name in enumerate(self.names)}
+        n = len(self.names)
+
+        # Parents' indices, where `n` stands for a parent who is not in
+        # the family and passes the gene on only by mutation; column `n`
+        # of the state always has no copies
+        self.mothers = np.array(
+            [index.get(people[name]["mother"], n) for name in self.names],
+            dtype=np.intp
+        )
+        self.fathers = np.array(
+            [index.get(people[name]["father"], n) for name in self.names],
+            dtype=np.intp
+        )
+        self.founders = np.array([
+            people[name]["mother"] is None and people[name]["father"] is None
+            for name in self.names
+        ], dtype=bool)
+        self.known = np.array(
+            [people[name]["trait"] is not None for name in self.names],
+            dtype=bool
+        )
+        has_trait = np.array(
+            [bool(people[name]["trait"]) for name in self.names], dtype=bool
+        )
+
+        # Log probabilities: prior[genes], inherit[mother, father, child]
+        # and evidence[i, genes] for person `i`'s known trait, if any
+        with np.errstate(divide="ignore"):
+            self.prior = np.log([probs["gene"][genes] for genes in GENES])
+            self.inherit = np.log([
+                [inheritance(mother, father, probs) for father in GENES]
+                for mother in GENES
+            ])
+            trait = np.array([probs["trait"][genes][True] for genes in GENES])
+            self.evidence = np.where(
+                self.known[:, None],
+                np.log(np.where(has_trait[:, None], trait, 1 - trait)),
+                0
+            )
+        self.trait = trait
+        self.has_trait = has_trait
+
+        # The same table indexed [father, child, mother] and
+        # [mother, child, father], to look up every count of one parent
+        self.by_mother = self.inherit.transpose(1, 2, 0)
+        self.by_father = self.inherit.transpose(0, 2, 1)
+
+        self.classes = []
+        children = [[] for _ in range(n)]
+        for child in range(n):
+            if not self.founders[child]:
+                for parent in (self.mothers[child], self.fathers[child]):
+                    if parent < n:
+                        children[parent].append(child)
+        for members in color_classes(self.mothers, self.fathers, n):
+            links = [
+                (position, child, self.mothers[child] == person)
+                for position, person in enumerate(members)
+                for child in children[person]
+            ]
+            positions, kids, as_mother = (
+                np.array(column) for column in zip(*links)
+            ) if links else (np.zeros(0, dtype=np.intp),) * 3
+            self.classes.append((
+                np.array(members, dtype=np.intp),
+                positions.astype(np.intp),
+                kids.astype(np.intp),
+                as_mother.astype(bool),
+            ))
+
+    def run(self, chains, sweeps, burn_in, rng):
+        """
+        Run `chains` chains from random starts for `burn_in` sweeps and
+        then `sweeps` counted sweeps, drawing random numbers from the
+        NumPy Generator `rng`.
+
+        Returns the sums over each of BATCHES batches of counted sweeps of
+        every person's conditional probability of each gene count and of
+        the trait, as an array indexed [chain, batch, person, quantity].
+        """
+        n = len(self.names)
+        state = np.zeros((chains, n + 1), dtype=np.intp)
+        state[:, :n] = rng.integers(3, size=(chains, n))
+        batches = max(1, min(BATCHES, sweeps))
+        sums = np.zeros((chains, batches, n, 4))
+        estimates = np.zeros((chains, n, 4))
+        for sweep in range(burn_in + sweeps):
+            for members, positions, kids, as_mother in self.classes:
+                conditional = self.conditional(state, members, positions, kids,
+                                               as_mother)
+                if sweep >= burn_in:
+                    estimates[:, members, :3] = conditional
+                cumulative = np.cumsum(conditional, axis=2)
+                draws = rng.random((chains, len(members)))
+                state[:, members] = (
+                    (draws[..., None] > cumulative[..., :2]).sum(axis=2)
+                )
+            if sweep >= burn_in:
+                counted = sweep - burn_in
+                estimates[:, :, 3] = np.where(
+                    self.known, self.has_trait, estimates[:, :, :3] @ self.trait
+                )
+                sums[:, counted * batches // sweeps] += estimates
+        return sums
+
+    def conditional(self, state, members, positions, kids, as_mother):
+        """
+        Return the probability of each gene count of each person in
+        `members` given everyone else's counts in `state`, as an array
+        indexed [chain, member, count].
+        """
+        mothers = state[:, self.mothers[members]]
+        fathers = state[:, self.fathers[members]]
+        logs = np.where(
+            self.founders[members, None],
+            self.prior,
+            self.inherit[mothers, fathers]
+        ) + self.evidence[members]
+
+        # Each child's probability, for every count of the parent
+        if len(kids):
+            genes = state[:, kids]
+            other = np.where(
+                as_mother,
+                state[:, self.fathers[kids]],
+                state[:, self.mothers[kids]]
+            )
+            children = np.where(
+                as_mother[:, None],
+                self.by_mother[other, genes],
+                self.by_father[other, genes]
+            )
+            np.add.at(logs, (slice(None), positions), children)
+
+        logs -= logs.max(axis=2, keepdims=True)
+        probabilities = np.exp(logs)
+        return probabilities / probabilities.sum(axis=2, keepdims=True)
+
+
+def color_classes(mothers, fathers, n):
+    """
+    Return lists of people, none of whom is in another's Markov blanket
+    (parents, children and their children's other parents), by greedy
+    coloring. `mothers` and `fathers` hold each person's parents, with
+    `n` for none.
+    """
+    blanket = [set() for _ in range(n)]
+    for child in range(n):
+        parents = [p for p in (mothers[child], fathers[child]) if p < n]
+        for parent in parents:
+            blanket[child].add(parent)
+            blanket[parent].add(child)
+            for other in parents:
+                if other != parent:
+                    blanket[parent].add(other)
+    colors = {}
+    classes = []
+    for person in range(n):
+        taken = {colors[p] for p in blanket[person] if p in colors}
+        color = next(c for c in range(len(classes) + 1) if c not in taken)
+        if color == len(classes):
+            classes.append([])
+        classes[color].append(person)
+        colors[person] = color
+    return classes
+
+
+def run_chains(people, probs, chains, sweeps, burn_in, seed):
+    """
+    Run a GibbsSampler on `people` in a worker process, seeded with the
+    NumPy SeedSequence `seed`. Returns `GibbsSampler.run`'s sums.
+    """
+    sampler = GibbsSampler(people, probs)
+    return sampler.run(chains, sweeps, burn_in, np.random.default_rng(seed))
+
+
+def sample(people, probs, samples=SAMPLES, chains=CHAINS, burn_in=BURN_IN,
+           seed=None, workers=1):
+    """
+    Estimate the probability of each person in `people` having each gene
+    count and having the trait by Gibbs sampling, with `chains` chains
+    split between `workers` processes and `samples` counted sweeps in
+    all. Returns the estimates in the form `heredity.main` prints, 95%
+    confidence intervals for them in the same form as (low, high) pairs,
+    and a dictionary of statistics: the "effective" sample size of the
+    least certain estimate, "seconds" and "per_second".
+
+    Estimates average each person's conditional distribution in each
+    sweep, rather than counting their sampled genes, which has lower
+    variance (Rao-Blackwellization).
+
+    Raises ValueError if there would be fewer than two batches of sweeps
+    over all chains, as the intervals need the spread of batch means.
+    """
+    started = time.perf_counter()
+    chains = max(chains, workers)
+    sweeps = max(1, math.ceil(samples / chains))
+    if chains * min(BATCHES, sweeps) < 2:
+        raise ValueError("sampling needs at least 2 samples or 2 chains "
+                         "for confidence intervals")
+    shares = [chains // workers + (i < chains % workers) for i in range(workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(
+                run_chains, [people] * workers, [probs] * workers, shares,
+                [sweeps] * workers, [burn_in] * workers, seeds
+            ))
+    else:
+        results = [run_chains(people, probs, chains, sweeps, burn_in, seeds[0])]
+
+    sums = np.concatenate(results)
+    batches = sums.shape[1]
+    sizes = np.bincount(np.arange(sweeps) * batches // sweeps, minlength=batches)
+    means = (sums / sizes[:, None, None]).reshape(-1, *sums.shape[2:])
+    draws = chains * sweeps
+    estimates = sums.sum(axis=(0, 1)) / draws
+
+    # Standard errors from the spread of batch means, and effective
+    # sample sizes as the number of independent draws of each gene count
+    # or trait that would estimate its probability as closely
+    errors = means.std(axis=0, ddof=1) / np.sqrt(len(means))
+    errors[errors < ROUNDING] = 0
+    variances = estimates * (1 - estimates)
+    varying = errors > 0
+    effective = (
+        float((variances[varying] / errors[varying] ** 2).min())
+        if varying.any() else float(draws)
+    )
+
+    probabilities = {}
+    intervals = {}
+    for i, name in enumerate(people):
+        values = {
+            "gene": {2: 2, 1: 1, 0: 0},
+            "trait": {True: 3, False: 3},
+        }
+        probabilities[name] = {}
+        intervals[name] = {}
+        for field, columns in values.items():
+            probabilities[name][field] = {}
+            intervals[name][field] = {}
+            for value, column in columns.items():
+                estimate = estimates[i, column]
+                error = errors[i, column]
+                if field == "trait" and not value:
+                    estimate = 1 - estimate
+                probabilities[name][field][value] = float(estimate)
+                intervals[name][field][value] = (
+                    float(max(0, estimate - Z_95 * error)),
+                    float(min(1, estimate + Z_95 * error)),
+                )
+    seconds = time.perf_counter() - started
+    return probabilities, intervals, {
+        "effective": effective,
+        "seconds": seconds,
+        "per_second": effective / seconds if seconds else float("inf"),
+    }
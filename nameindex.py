@@ -0,0 +1,292 @@
+import unicodedata
+from collections import Counter, defaultdict
+from array import array
+from bisect import bisect_left
+
+# Match kinds, in ranking order
+EXACT = "exact"
+PREFIX = "prefix"
+FUZZY = "fuzzy"
+KINDS = [EXACT, PREFIX, FUZZY]
+
+# Most names, shortest first, scanned for matches to a short prefix
+PREFIX_SCAN = 1000
+
+# Prefixes of up to this many names have them sorted by length directly,
+# rather than found in the keys grouped by length
+PREFIX_SORT = 64
+
+# Rare query trigrams a fuzzy candidate must share (see `fuzzy_keys`)
+SHARED = 3
+
+# Sorts after every character, so the keys starting with a prefix `p`
+# are exactly those between `p` and `p + LAST_CHARACTER`
+LAST_CHARACTER = chr(0x10FFFF)
+
+
+class NameIndex():
+    """
+    Index of people's names supporting exact, prefix and fuzzy lookup.
+
+    Names are normalized (see `normalize`) and kept in a sorted list of
+    distinct keys, with the people sharing each key stored in CSR form,
+    so exact and prefix lookups are a binary search. The keys are also
+    grouped by length, for listing prefix matches shortest first, and
+    indexed by trigram for fuzzy lookup, all when the index is built.
+    """
+
+    def __init__(self, person_ids, person_names, weight=None):
+        """
+        Index `person_names`, whose people are identified by the matching
+        entries of `person_ids`. `weight(i)` ranks people with equally good
+        matches, such as the number of movies of the person at index `i`.
+        """
+        self.person_ids = person_ids
+        self.person_names = person_names
+        self.weight = weight or (lambda i: 0)
+
+        normalized = [normalize(name) for name in person_names]
+        order = sorted(range(len(normalized)), key=normalized.__getitem__)
+
+        # Group people by key: the people called `keys[k]` are
+        # `key_people[key_offsets[k]:key_offsets[k + 1]]`
+        self.keys = []
+        self.key_offsets = array("i")
+        self.key_people = array("i", order)
+        for position, person in enumerate(order):
+            if not self.keys or normalized[person] != self.keys[-1]:
+                self.keys.append(normalized[person])
+                self.key_offsets.append(position)
+        self.key_offsets.append(len(order))
+
+        # The keys of each length, in sorted order, and their numbers:
+        # `length_keys[n][p]` is key number `length_numbers[n][p]`
+        self.length_keys = {}
+        self.length_numbers = {}
+        for k, key in enumerate(self.keys):
+            if len(key) not in self.length_keys:
+                self.length_keys[len(key)] = []
+                self.length_numbers[len(key)] = array("i")
+            self.length_keys[len(key)].append(key)
+            self.length_numbers[len(key)].append(k)
+        self.lengths = sorted(self.length_keys)
+
+        self.trigrams = build_trigrams(self.keys)
+
+    def lookup(self, name, limit=10):
+        """
+        Returns up to `limit` ranked (person_id, kind, distance) matches
+        for `name`, where kind is "exact", "prefix" or "fuzzy" and distance
+        is the edit distance between the normalized names.
+
+        Exact matches rank first, then prefix matches. Fuzzy matches are
+        only searched for if no name matches exactly or by prefix.
+        """
+        query = normalize(name)
+        if not query:
+            return []
+
+        matches = []
+        seen = set()
+        for rank, searcher in enumerate([
+            self.exact_keys, self.prefix_keys, self.fuzzy_keys
+        ]):
+            if len(matches) >= limit or (matches and rank == KINDS.index(FUZZY)):
+                break
+            for key, distance in searcher(query):
+
+                # Keys arrive closest first, so once there are enough
+                # matches only ties with the last match can still rank
+                if len(matches) >= limit and distance > matches[-1][1]:
+                    break
+                if key in seen:
+                    continue
+                seen.add(key)
+                for person in self.people_for_key(key):
+                    matches.append(
+                        (rank, distance, -self.weight(person), person)
+                    )
+
+        matches.sort()
+        return [
+            (self.person_ids[person], KINDS[rank], distance)
+            for rank, distance, _, person in matches[:limit]
+        ]
+
+    def people_for_key(self, key):
+        """
+        Returns the indices of people whose name normalizes to key
+        number `key`.
+        """
+        return self.key_people[self.key_offsets[key]:self.key_offsets[key + 1]]
+
+    def exact_keys(self, query):
+        """
+        Yield (key, 0) for the key equal to `query`, if any.
+        """
+        k = bisect_left(self.keys, query)
+        if k < len(self.keys) and self.keys[k] == query:
+            yield k, 0
+
+    def prefix_keys(self, query):
+        """
+        Yield (key, distance) for keys starting with `query`, shortest
+        names first, up to PREFIX_SCAN of them.
+        """
+        # Count the matches first, to stop once every one is found
+        start = bisect_left(self.keys, query)
+        end = bisect_left(self.keys, query + LAST_CHARACTER, start)
+        if end - start <= PREFIX_SORT:
+            keys = self.keys
+            for k in sorted(range(start, end), key=lambda k: len(keys[k])):
+                yield k, len(keys[k]) - len(query)
+            return
+        remaining = min(end - start, PREFIX_SCAN)
+
+        for length in self.lengths[bisect_left(self.lengths, len(query)):]:
+            if not remaining:
+                return
+            keys = self.length_keys[length]
+            start = bisect_left(keys, query)
+            end = bisect_left(keys, query + LAST_CHARACTER, start)
+            end = min(end, start + remaining)
+            numbers = self.length_numbers[length]
+            for position in range(start, end):
+                yield numbers[position], length - len(query)
+            remaining -= end - start
+
+    def fuzzy_keys(self, query, max_distance=None):
+        """
+        Yield (key, distance) for keys within `max_distance` edits of
+        `query`, closest first.
+
+        One edit changes at most three trigrams, so a key within `d` edits
+        contains all but `3d` of the query's trigrams, and so at least
+        SHARED of its `3d + SHARED` rarest ones. Only keys found that way,
+        among those within `d` characters of the query's length, and
+        missing at most `3d` trigrams, are compared in full. A query with
+        no more than `3d` trigrams may share none with a match, so every
+        key of a length in reach is compared instead.
+        """
+        if max_distance is None:
+            max_distance = 1 if len(query) <= 12 else 2
+        reach = range(len(query) - max_distance, len(query) + max_distance + 1)
+
+        # Postings of each query trigram, for keys of the lengths in reach
+        tables = [
+            self.trigrams[length] for length in reach if length in self.trigrams
+        ]
+        postings = {
+            trigram: [table[trigram] for table in tables if trigram in table]
+            for trigram in trigrams(query)
+        }
+        query_trigrams = sorted(
+            postings, key=lambda trigram: sum(map(len, postings[trigram]))
+        )
+        if len(query_trigrams) <= 3 * max_distance:
+            candidates = [
+                k for length in reach if length in self.length_numbers
+                for k in self.length_numbers[length]
+            ]
+        else:
+            counts = Counter()
+            for trigram in query_trigrams[:3 * max_distance + SHARED]:
+                for posting in postings[trigram]:
+                    counts.update(posting)
+            needed = min(SHARED, len(query_trigrams) - 3 * max_distance)
+            candidates = [k for k, count in counts.items() if count >= needed]
+
+        matches = []
+        for k in candidates:
+            key = self.keys[k]
+
+            # Give up on keys missing more trigrams than the edits allow,
+            # checking the rarest (most likely missing) trigrams first
+            padded = f"  {key} "
+            misses = 0
+            for trigram in query_trigrams:
+                if trigram not in padded:
+                    misses += 1
+                    if misses > 3 * max_distance:
+                        break
+            if misses > 3 * max_distance:
+                continue
+            distance = edit_distance(query, key, max_distance)
+            if distance is not None:
+                matches.append((distance, k))
+        for distance, k in sorted(matches):
+            yield k, distance
+
+
+def normalize(name):
+    """
+    Return `name` lowercased, with accents removed and runs of
+    whitespace collapsed to single spaces.
+    """
+    if not name.isascii():
+        name = "".join(
+            c for c in unicodedata.normalize("NFKD", name)
+            if not unicodedata.combining(c)
+        )
+    return " ".join(name.lower().split())
+
+
+def trigrams(key):
+    """
+    Return the set of three-character substrings of `key`, padded so
+    that the start and end of the name form trigrams of their own.
+    """
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_trigrams(keys):
+    """
+    Return a dictionary mapping each key length to a dictionary mapping
+    each trigram to an array of the indices of the `keys` of that length
+    containing it.
+    """
+    index = {}
+    for k, key in enumerate(keys):
+        table = index.get(len(key))
+        if table is None:
+            index[len(key)] = table = defaultdict(list)
+        for trigram in trigrams(key):
+            table[trigram].append(k)
+    return {
+        length: {trigram: array("i", posting) for trigram, posting in table.items()}
+        for length, table in index.items()
+    }
+
+
+def edit_distance(a, b, limit):
+    """
+    Return the Levenshtein distance between `a` and `b`, or None if it
+    is greater than `limit`.
+
+    Only cells within `limit` of the diagonal can stay within the limit,
+    so the rest of each row is never computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return None
+    beyond = limit + 1
+    previous = [j if j <= limit else beyond for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        char_a = a[i - 1]
+        current = [beyond] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        best = current[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = previous[j - 1] + (char_a != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+            if cost < best:
+                best = cost
+        if best > limit:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= limit else None
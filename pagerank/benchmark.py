@@ -0,0 +1,461 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from linkgraph import (
+    COMPARISON_METHODS, METHODS, LinkGraph, power_iteration, stream_pagerank,
+    update_ranks
+)
+from pagerank import (
+    DAMPING, SAMPLES, THRESHOLD, crawl, iterate_pagerank, sample_pagerank
+)
+
+# Degree distributions `synthetic_graph` can generate
+MODELS = ["erdos-renyi", "power-law"]
+
+# Shape of the Pareto distribution of out-degrees, and the exponent of
+# the Zipf-like popularity of link targets, in "power-law" graphs
+POWER_LAW_SHAPE = 1.5
+POWER_LAW_EXPONENT = 0.8
+
+# Pages up to which the reference ranks engines are compared to are
+# solved for directly, and the convergence threshold of larger ones
+DENSE_REFERENCE = 4000
+REFERENCE_THRESHOLD = 1e-14
+
+# Each page of a synthetic HTML corpus, in the style of corpus0-2
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+    <head>
+        <title>{title}</title>
+    </head>
+    <body>
+        <h1>{title}</h1>
+
+        <div>Links:</div>
+        <ul>
+{links}
+        </ul>
+    </body>
+</html>
+"""
+LINK_TEMPLATE = '            <li><a href="{page}">{title}</a></li>'
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark PageRank engines on synthetic corpora."
+    )
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    incremental = subparsers.add_parser(
+        "incremental",
+        help="compare updating ranks after a small change with a cold start"
+    )
+    add_corpus_arguments(incremental)
+    incremental.add_argument("--changed", type=int, default=20,
+                             help="pages whose links change")
+    incremental.add_argument("--added", type=int, default=5,
+                             help="pages added")
+    incremental.add_argument("--removed", type=int, default=5,
+                             help="pages removed")
+    incremental.add_argument("--thresholds", default="1e-8,1e-10,1e-12",
+                             help="comma-separated convergence thresholds")
+
+    convergence = subparsers.add_parser(
+        "convergence",
+        help="compare the sweeps and time each iteration method needs"
+    )
+    add_corpus_arguments(convergence)
+    convergence.add_argument("--dampings", default="0.85,0.95,0.99",
+                             help="comma-separated damping factors")
+    convergence.add_argument("--tolerance", type=float, default=1e-10)
+    convergence.add_argument("--max-iterations", type=int, default=5000)
+
+    generate = subparsers.add_parser(
+        "generate",
+        help="write a synthetic HTML corpus and its link graph file"
+    )
+    generate.add_argument("directory",
+                          help="directory to write the HTML pages to")
+    add_synthetic_arguments(generate)
+    generate.add_argument("-n", "--pages", type=int, default=1000)
+    generate.add_argument("--save-links", metavar="FILE",
+                          help="also save the link graph to FILE")
+
+    suite = subparsers.add_parser(
+        "suite",
+        help="time every PageRank engine on synthetic corpora and write "
+             "the results as JSON"
+    )
+    add_synthetic_arguments(suite)
+    suite.add_argument("--sizes", default="1000,10000,100000",
+                       help="comma-separated numbers of pages")
+    suite.add_argument("--models", default=",".join(MODELS),
+                       help="comma-separated degree distributions")
+    suite.add_argument("--samples", type=int, default=SAMPLES)
+    suite.add_argument("--tolerance", type=float, default=1e-10,
+                       help="threshold for the iterating engines")
+    suite.add_argument("--workers", type=int, default=1,
+                       help="processes crawling each corpus")
+    suite.add_argument("--output", default="benchmark.json",
+                       help="file to write the JSON results to")
+
+    args = parser.parse_args()
+
+    if args.benchmark == "incremental":
+        thresholds = [float(t) for t in args.thresholds.split(",")]
+        benchmark_incremental(
+            args.pages, args.links, args.seed,
+            args.changed, args.added, args.removed, thresholds
+        )
+    elif args.benchmark == "convergence":
+        dampings = [float(d) for d in args.dampings.split(",")]
+        benchmark_convergence(
+            args.pages, args.links, args.seed,
+            dampings, args.tolerance, args.max_iterations
+        )
+    elif args.benchmark == "generate":
+        graph = synthetic_graph(
+            args.model, args.pages, args.links, args.dangling,
+            np.random.default_rng(args.seed)
+        )
+        write_html_corpus(args.directory, graph)
+        if args.save_links:
+            graph.save(args.save_links)
+        print(f"Wrote {len(graph.pages)} pages with {len(graph.targets)} "
+              f"links to {args.directory}")
+    elif args.benchmark == "suite":
+        models = args.models.split(",")
+        for model in models:
+            if model not in MODELS:
+                sys.exit(f"Unknown model {model}, expected one of {MODELS}")
+        benchmark_suite(
+            [int(size) for size in args.sizes.split(",")], models,
+            args.links, args.dangling, args.seed, args.samples,
+            args.tolerance, args.workers, args.output
+        )
+
+
+def add_corpus_arguments(parser):
+    parser.add_argument("-n", "--pages", type=int, default=200000,
+                        help="pages in the synthetic corpus")
+    parser.add_argument("--links", type=int, default=6,
+                        help="average links per page")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def add_synthetic_arguments(parser):
+    parser.add_argument("--model", choices=MODELS, default="power-law",
+                        help="degree distribution (default: power-law)")
+    parser.add_argument("--links", type=float, default=6,
+                        help="average links per page with links")
+    parser.add_argument("--dangling", type=float, default=0.1,
+                        help="fraction of pages without links")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def synthetic_graph(model, pages, links, dangling, rng):
+    """
+    Return a LinkGraph of `pages` pages, of which a `dangling` fraction
+    have no links and the rest link to an average of about `links`
+    pages, drawing random numbers from the NumPy Generator `rng`.
+
+    In an "erdos-renyi" graph every possible link is equally likely, so
+    out-degrees are Poisson and targets uniform. In a "power-law" graph
+    out-degrees follow a Pareto distribution and pages are linked to with
+    a Zipf-like popularity, so a few pages have most of the links.
+    Duplicate links and links from a page to itself are dropped.
+    """
+    if model == "erdos-renyi":
+        degrees = rng.poisson(links, pages)
+        weights = None
+    else:
+        # A Pareto (Lomax) variable of shape a has mean 1 / (a - 1)
+        degrees = np.floor(
+            rng.pareto(POWER_LAW_SHAPE, pages) * (POWER_LAW_SHAPE - 1) * links
+        ).astype(np.int64)
+        weights = rng.permutation(
+            np.arange(1, pages + 1, dtype=np.float64) ** -POWER_LAW_EXPONENT
+        )
+        weights /= weights.sum()
+    degrees = np.clip(degrees, 1, max(pages - 1, 1))
+    degrees[rng.choice(pages, round(dangling * pages), replace=False)] = 0
+
+    sources = np.repeat(np.arange(pages, dtype=np.int64), degrees)
+    targets = rng.choice(pages, len(sources), p=weights)
+    keep = sources != targets
+    links = np.unique(sources[keep] * pages + targets[keep])
+    offsets = np.zeros(pages + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(links // pages, minlength=pages))
+
+    # Zero-padded names sort in page order, as LinkGraph expects
+    width = len(str(max(pages - 1, 0)))
+    names = [f"{i:0{width}d}.html" for i in range(pages)]
+    return LinkGraph(names, offsets, (links % pages).astype(np.int32))
+
+
+def write_html_corpus(directory, graph):
+    """
+    Write each page of `graph` to `directory` as an HTML file linking to
+    the pages it links to.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for i, page in enumerate(graph.pages):
+        title = page.removesuffix(".html")
+        links = [
+            LINK_TEMPLATE.format(
+                page=graph.pages[target],
+                title=graph.pages[target].removesuffix(".html")
+            )
+            for target in graph.targets[graph.offsets[i]:graph.offsets[i + 1]]
+        ]
+        with open(os.path.join(directory, page), "w") as f:
+            f.write(PAGE_TEMPLATE.format(title=title, links="\n".join(links)))
+
+
+def reference_ranks(graph, damping_factor):
+    """
+    Return the PageRank of each page of `graph`, computed apart from the
+    engines being measured: for up to DENSE_REFERENCE pages by solving
+    (I - dM)r = (1 - d) / n, with M the dense transition matrix, and for
+    more by power sweeps written out here, until no rank changes by
+    REFERENCE_THRESHOLD.
+    """
+    n = len(graph.pages)
+    degrees = np.diff(graph.offsets)
+    sources = np.repeat(np.arange(n), degrees)
+    targets = np.asarray(graph.targets, dtype=np.int64)
+    dangling = degrees == 0
+    if n <= DENSE_REFERENCE:
+        matrix = np.zeros((n, n))
+        np.add.at(matrix, (targets, sources), 1 / degrees[sources])
+        matrix[:, dangling] = 1 / n
+        return np.linalg.solve(
+            np.eye(n) - damping_factor * matrix,
+            np.full(n, (1 - damping_factor) / n)
+        )
+
+    weights = damping_factor / degrees[sources]
+    ranks = np.full(n, 1 / n)
+    while True:
+        new_ranks = np.full(
+            n, (1 - damping_factor + damping_factor * ranks[dangling].sum()) / n
+        )
+        np.add.at(new_ranks, targets, ranks[sources] * weights)
+        if np.abs(new_ranks - ranks).max() < REFERENCE_THRESHOLD:
+            return new_ranks
+        ranks = new_ranks
+
+
+def random_corpus(pages, links, rng):
+    """
+    Return a corpus of `pages` pages linking to an average of `links`
+    pages chosen uniformly at random.
+    """
+    names = [f"{i}.html" for i in range(pages)]
+    return {
+        name: set(rng.sample(names, rng.randrange(2 * links + 1))) - {name}
+        for name in names
+    }
+
+
+def change_corpus(corpus, changed, added, removed, rng):
+    """
+    Return a copy of `corpus` with the links of `changed` pages replaced,
+    `added` new pages and `removed` pages taken out.
+    """
+    corpus = dict(corpus)
+    names = sorted(corpus)
+    for name in rng.sample(names, changed):
+        corpus[name] = set(rng.sample(names, len(corpus[name]) or 1)) - {name}
+    for name in rng.sample(names, removed):
+        del corpus[name]
+    names = sorted(corpus)
+    for i in range(added):
+        corpus[f"new{i}.html"] = set(rng.sample(names, 5))
+    return corpus
+
+
+def benchmark_incremental(pages, links, seed, changed, added, removed, thresholds):
+    rng = random.Random(seed)
+    print(f"Generating {pages} pages...")
+    corpus = random_corpus(pages, links, rng)
+    before = LinkGraph.from_corpus(corpus)
+    previous = dict(zip(before.pages, power_iteration(before, DAMPING, 1e-13)))
+    after = LinkGraph.from_corpus(
+        change_corpus(corpus, changed, added, removed, rng)
+    )
+
+    # Reference ranks to measure the error of each run against
+    reference = reference_ranks(after, DAMPING)
+    start = np.array([
+        previous.get(page, 1 / len(after.pages)) for page in after.pages
+    ])
+    start /= start.sum()
+
+    print(f"Incremental benchmark ({changed} changed, {added} added, "
+          f"{removed} removed)")
+    print(f"  {'threshold':>9}  {'cold':>9} {'error':>8}  {'update':>9} "
+          f"{'error':>8}  {'speedup':>7}")
+    for threshold in thresholds:
+        begin = time.perf_counter()
+        cold = power_iteration(after, DAMPING, threshold)
+        cold_time = time.perf_counter() - begin
+        begin = time.perf_counter()
+        warm = update_ranks(after, DAMPING, start, threshold)
+        warm_time = time.perf_counter() - begin
+        print(f"  {threshold:9.0e}  {cold_time:8.3f}s "
+              f"{np.abs(cold - reference).max():8.1e}  {warm_time:8.3f}s "
+              f"{np.abs(warm - reference).max():8.1e}  "
+              f"{cold_time / warm_time:6.1f}x")
+
+
+def benchmark_convergence(pages, links, seed, dampings, tolerance,
+                          max_iterations):
+    rng = random.Random(seed)
+    print(f"Generating {pages} pages...")
+    graph = LinkGraph.from_corpus(random_corpus(pages, links, rng))
+
+    print(f"Convergence benchmark (tolerance {tolerance:.0e})")
+    print(f"  {'damping':>7}  {'method':<12} {'sweeps':>6} {'time':>9} "
+          f"{'error':>8}")
+    for damping in dampings:
+
+        # Reference ranks to measure the error of each method against
+        reference = reference_ranks(graph, damping)
+        for method in METHODS + COMPARISON_METHODS:
+            entries = []
+            ranks = power_iteration(
+                graph, damping, tolerance,
+                max_iterations=max_iterations, method=method,
+                log=entries.append
+            )
+            summary = entries[-1]
+            print(f"  {damping:7.2f}  {method:<12} "
+                  f"{summary['iterations']:6d}"
+                  f"{'' if summary['converged'] else '+'} "
+                  f"{summary['seconds']:8.3f}s "
+                  f"{np.abs(ranks - reference).max():8.1e}")
+
+
+def benchmark_suite(sizes, models, links, dangling, seed, samples, tolerance,
+                    workers, output):
+    results = []
+    print(f"  {'graph':<22} {'engine':<14} {'time':>9} {'max error':>10} "
+          f"{'l1 error':>10}")
+    for model in models:
+        for pages in sizes:
+            graph = synthetic_graph(
+                model, pages, links, dangling, np.random.default_rng(seed)
+            )
+            with tempfile.TemporaryDirectory() as directory:
+                corpus_directory = os.path.join(directory, "corpus")
+                links_file = os.path.join(directory, "corpus.links")
+                write_html_corpus(corpus_directory, graph)
+                graph.save(links_file)
+                runs = suite_runs(
+                    graph, corpus_directory, links_file, samples, tolerance,
+                    workers, seed
+                )
+                reference = reference_ranks(graph, DAMPING)
+                label = f"{model} {pages}"
+                for run in runs:
+                    if run.get("ranks") is not None:
+                        error = np.abs(run.pop("ranks") - reference)
+                        run["max_error"] = float(error.max())
+                        run["l1_error"] = float(error.sum())
+                    errors = (
+                        f"{run['max_error']:10.1e} {run['l1_error']:10.1e}"
+                        if "max_error" in run else f"{'-':>10} {'-':>10}"
+                    )
+                    print(f"  {label:<22} {run['engine']:<14} "
+                          f"{run['seconds']:8.3f}s {errors}")
+                    results.append({
+                        "model": model,
+                        "pages": pages,
+                        "links": int(len(graph.targets)),
+                        "dangling": int((graph.out_degrees == 0).sum()),
+                        **run,
+                    })
+
+    with open(output, "w") as f:
+        json.dump({
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "cpus": os.cpu_count(),
+            "settings": {
+                "links": links,
+                "dangling": dangling,
+                "seed": seed,
+                "samples": samples,
+                "tolerance": tolerance,
+                "workers": workers,
+                "damping": DAMPING,
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"Wrote {len(results)} results to {output}")
+
+
+def suite_runs(graph, corpus_directory, links_file, samples, tolerance,
+               workers, seed):
+    """
+    Time each engine on one synthetic corpus, saved as HTML pages in
+    `corpus_directory` and as a link graph file at `links_file`.
+
+    Return a list of runs, each a dictionary of the engine's name, time
+    in seconds and, except for crawling, its ranks as an array in page
+    order, with the iterations it made where that is known.
+    """
+    runs = []
+
+    def timed(engine, function, *args, **kwargs):
+        start = time.perf_counter()
+        value = function(*args, **kwargs)
+        runs.append({"engine": engine, "seconds": time.perf_counter() - start})
+        return value
+
+    corpus = timed("crawl", crawl, corpus_directory)
+    if workers > 1:
+        timed(f"crawl x{workers}", crawl, corpus_directory, workers)
+
+    # The engines of pagerank.py, from the crawled corpus
+    ranks = timed("sample", sample_pagerank, corpus, DAMPING, samples, seed)
+    runs[-1]["ranks"] = np.array([ranks[page] for page in graph.pages])
+    ranks = timed("iterate", iterate_pagerank, corpus, DAMPING, THRESHOLD)
+    runs[-1]["ranks"] = np.array([ranks[page] for page in graph.pages])
+
+    # Faster engines on the link graph, at `tolerance`
+    for method in METHODS:
+        entries = []
+        ranks = timed(
+            method, power_iteration, graph, DAMPING, tolerance,
+            method=method, log=entries.append
+        )
+        runs[-1]["ranks"] = ranks
+        runs[-1]["iterations"] = entries[-1]["iterations"]
+    entries = []
+    ranks = timed(
+        "stream", stream_pagerank, links_file, DAMPING, tolerance,
+        log=entries.append
+    )
+    runs[-1]["ranks"] = ranks
+    runs[-1]["iterations"] = entries[-1]["iterations"]
+    runs[-1]["megabytes_per_second"] = (
+        entries[-1]["bytes"] / 1e6 / entries[-1]["read_seconds"]
+        if entries[-1]["read_seconds"] else None
+    )
+    return runs
+
+
+if __name__ == "__main__":
+    main()
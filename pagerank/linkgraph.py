@@ -0,0 +1,678 @@
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+# Binary edge list files written by `LinkGraph.save`
+LINKS_MAGIC = b"PRLINKS\0"
+
+# Bump whenever the edge list layout changes
+LINKS_VERSION = 2
+
+# Random surfers advanced together by `random_walk`
+WALKERS = 4096
+
+# Steps each surfer takes before its visits are counted. Every step
+# teleports with probability at least 1 - damping, so after 50 steps
+# (0.85 ** 50 < 0.001) a surfer has all but forgotten where it started
+BURN_IN = 50
+
+# Visits recorded between updates of the visit counts
+BUFFER_SIZE = 1 << 20
+
+# `update_ranks` pushes every residual at once when more than one in
+# this many pages has a residual to push
+DENSE_PUSH = 4
+
+# Ways `power_iteration` can make its sweeps, and measure their change
+METHODS = ["power", "gauss-seidel", "quadratic"]
+NORMS = ["max", "l1"]
+
+# Methods `power_iteration` also accepts, only to compare with METHODS in
+# benchmark.py: componentwise Aitken extrapolation takes more sweeps
+# than plain power iteration
+COMPARISON_METHODS = ["aitken"]
+
+# Blocks of pages updated in turn by a Gauss-Seidel sweep
+GAUSS_SEIDEL_BLOCKS = 64
+
+# Sweeps between extrapolations by the "aitken" and "quadratic" methods
+EXTRAPOLATION_PERIOD = 10
+
+# Links read from disk at a time by `stream_pagerank`
+STREAM_BLOCK = 1 << 22
+
+
+class LinkGraph():
+    """
+    The links between the pages of a corpus, in compressed sparse row form.
+
+    Pages are numbered in sorted order of their names, and the pages
+    linked to by page `i` are `targets[offsets[i]:offsets[i + 1]]`.
+    """
+
+    def __init__(self, pages, offsets, targets):
+        self.pages = pages
+        self.offsets = offsets
+        self.targets = targets
+        self.out_degrees = np.diff(offsets)
+
+        # The page each link comes from, so a sweep over every link is
+        # a single vectorized gather
+        self.sources = np.repeat(
+            np.arange(len(pages), dtype=targets.dtype), self.out_degrees
+        )
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Build a graph from a corpus as returned by `crawl`, mapping each
+        page to the set of pages it links to. Links to pages outside the
+        corpus are ignored.
+        """
+        pages = sorted(corpus)
+        index = {page: i for i, page in enumerate(pages)}
+        offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+        targets = []
+        for i, page in enumerate(pages):
+            targets.extend(sorted(
+                index[link] for link in corpus[page] if link in index
+            ))
+            offsets[i + 1] = len(targets)
+        return cls(pages, offsets, np.array(targets, dtype=np.int32))
+
+    def save(self, filename, extra=None):
+        """
+        Write the graph to a binary edge list at `filename`: a JSON header
+        followed by the page names and the offset and target arrays.
+        `extra` maps names to more arrays to store alongside them, which
+        `load_arrays` reads back.
+        """
+        write_arrays(filename, {
+            "pages": pack_strings(self.pages),
+            "offsets": np.asarray(self.offsets, dtype=np.int64),
+            "targets": np.asarray(self.targets, dtype=np.int32),
+            **(extra or {}),
+        })
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Load a graph written by `save`, memory-mapping its arrays.
+
+        Raises ValueError if `filename` is not such a file, or was written
+        by another version or on a platform with another byte order.
+        """
+        arrays = load_arrays(filename)
+        return cls(
+            unpack_strings(arrays["pages"]), arrays["offsets"], arrays["targets"]
+        )
+
+    def transpose(self):
+        """
+        Return the graph with every link reversed.
+        """
+        order = np.argsort(self.targets, kind="stable")
+        offsets = np.zeros(len(self.pages) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(self.targets, minlength=len(self.pages)))
+        return LinkGraph(self.pages, offsets, self.sources[order])
+
+    def spread(self, ranks):
+        """
+        Return the rank each page receives when every page with links
+        splits its rank in `ranks` evenly between them.
+        """
+        shares = np.divide(
+            ranks, self.out_degrees,
+            out=np.zeros_like(ranks), where=self.out_degrees > 0
+        )
+        return np.bincount(
+            self.targets, weights=shares[self.sources], minlength=len(self.pages)
+        )
+
+
+def power_iteration(graph, damping_factor, threshold, norm="max",
+                    max_iterations=None, method="power", log=None,
+                    teleport=None):
+    """
+    Return the PageRank of each page of `graph` as an array, iterating
+    from a uniform start until the ranks change by less than `threshold`
+    in one sweep, or `max_iterations` sweeps have been made. The change
+    is the largest change to any page for the "max" norm, or the total
+    change for "l1".
+
+    A page without links is treated as linking to every page, including
+    itself. Rather than adding those links, the total rank of such
+    pages is shared evenly between all pages, a rank-one correction.
+
+    `method` is one of METHODS or COMPARISON_METHODS:
+    - "power" computes every page's new rank from the last sweep's ranks
+    - "gauss-seidel" updates blocks of pages in turn, each from the
+      newest ranks of the pages linking to it
+    - "aitken" and "quadratic" make power sweeps, but every
+      EXTRAPOLATION_PERIOD sweeps estimate the limit from the last three
+      or four and jump to it
+
+    If `teleport` is given, surfers teleport to pages by that
+    distribution rather than uniformly, and iteration starts from it.
+    Gauss-Seidel sweeps only support uniform teleports.
+
+    If `log` is given, it is called with a dictionary describing each
+    sweep, and then with one summarizing the whole iteration.
+    """
+    n = len(graph.pages)
+    dangling = graph.out_degrees == 0
+    if teleport is None:
+        ranks = np.full(n, 1 / n)
+        teleported = (1 - damping_factor) / n
+    elif method == "gauss-seidel":
+        raise ValueError("gauss-seidel sweeps need uniform teleports")
+    else:
+        ranks = teleport
+        teleported = (1 - damping_factor) * teleport
+    if method == "gauss-seidel":
+        power_sweep = gauss_seidel_sweeper(graph, damping_factor)
+    else:
+        def power_sweep(ranks):
+            return teleported + damping_factor * (
+                graph.spread(ranks) + ranks[dangling].sum() / n
+            )
+
+    history = [ranks]
+
+    def sweep(ranks, iteration):
+        nonlocal history
+        new_ranks = power_sweep(ranks)
+        history.append(new_ranks)
+
+        # Extrapolated ranks jump towards the limit, so how far they moved
+        # says nothing about convergence
+        extrapolated = (
+            method in ["aitken", "quadratic"] and
+            iteration % EXTRAPOLATION_PERIOD == 0
+        )
+        if extrapolated:
+            if method == "aitken":
+                new_ranks = aitken_extrapolation(*history[-3:])
+            else:
+                new_ranks = quadratic_extrapolation(*history[-4:])
+            history = [new_ranks]
+        del history[:-4]
+
+        change = np.abs(new_ranks - ranks)
+        return new_ranks, {
+            "method": method,
+            "norm": norm,
+            "residual": float(change.max() if norm == "max" else change.sum()),
+            "extrapolated": extrapolated,
+        }
+
+    return converge(sweep, ranks, threshold, max_iterations, log)
+
+
+def converge(sweep, ranks, threshold, max_iterations=None, log=None,
+             totals=None):
+    """
+    Return `ranks` after calling `sweep(ranks, iteration)` on them
+    repeatedly, until a sweep's residual is below `threshold` or
+    `max_iterations` sweeps have been made.
+
+    `sweep` returns the new ranks and a dictionary describing the sweep,
+    with its "residual" and whether it "extrapolated" the ranks, which
+    never counts as converging. If `log` is given, it is called with
+    each of those, numbered and timed, and then with a summary of the
+    whole iteration, including the dictionary `totals` if given.
+    """
+    started = time.perf_counter()
+    iteration = 0
+    residual = None
+    converged = False
+    while max_iterations is None or iteration < max_iterations:
+        began = time.perf_counter()
+        iteration += 1
+        ranks, entry = sweep(ranks, iteration)
+        residual = entry["residual"]
+        if log is not None:
+            log({
+                "iteration": iteration,
+                **entry,
+                "seconds": time.perf_counter() - began,
+            })
+        if residual < threshold and not entry["extrapolated"]:
+            converged = True
+            break
+
+    if log is not None:
+        log({
+            "converged": converged,
+            "iterations": iteration,
+            "residual": residual,
+            "seconds": time.perf_counter() - started,
+            **(totals or {}),
+        })
+    return ranks
+
+
+def personalized_power_iteration(graph, damping_factor, teleports, threshold,
+                                 norm="max", max_iterations=None, log=None):
+    """
+    Return the personalized PageRank of each page of `graph` for each
+    column of `teleports`, an array with a row per page whose columns
+    are the distributions surfers teleport with, as an array of the same
+    shape. Columns are normalized to sum to 1.
+
+    Each column is ranked in turn by `power_iteration` with that
+    teleport. The entries passed to `log` are those of each column's
+    iteration, marked with its "column", and then a summary of them all.
+
+    Raises ValueError if `teleports` has the wrong number of rows,
+    negative entries or a column summing to 0.
+    """
+    n = len(graph.pages)
+    teleports = np.asarray(teleports, dtype=np.float64)
+    if teleports.ndim != 2 or len(teleports) != n:
+        raise ValueError(f"teleports must have a row for each of the {n} pages")
+    if (teleports < 0).any():
+        raise ValueError("teleports must not be negative")
+    totals = teleports.sum(axis=0)
+    if (totals == 0).any():
+        raise ValueError("every column of teleports must have a positive sum")
+    teleports = teleports / totals
+
+    started = time.perf_counter()
+    summaries = []
+    ranks = np.empty_like(teleports)
+    for column in range(teleports.shape[1]):
+        def column_log(entry):
+            if "converged" in entry:
+                summaries.append(entry)
+            if log is not None:
+                log({**entry, "column": column})
+        ranks[:, column] = power_iteration(
+            graph, damping_factor, threshold, norm, max_iterations,
+            log=column_log, teleport=teleports[:, column]
+        )
+
+    if log is not None:
+        log({
+            "converged": all(summary["converged"] for summary in summaries),
+            "iterations": sum(summary["iterations"] for summary in summaries),
+            "residual": summaries[-1]["residual"] if summaries else None,
+            "seconds": time.perf_counter() - started,
+        })
+    return ranks
+
+
+def gauss_seidel_sweeper(graph, damping_factor):
+    """
+    Return a function making a Gauss-Seidel sweep over `graph`.
+
+    Pages are split into GAUSS_SEIDEL_BLOCKS blocks, updated in turn
+    from the newest ranks, so later blocks already see the rank earlier
+    blocks passed along their links. Within a block the update is a
+    single vectorized sum over the links into it.
+
+    Updating in place does not keep the total rank at 1, and the error
+    in the total decays slowly for damping factors near 1, so each sweep
+    ends by normalizing the ranks.
+    """
+    n = len(graph.pages)
+    links_in = graph.transpose()
+    dangling = graph.out_degrees == 0
+    share = np.divide(
+        1, graph.out_degrees,
+        out=np.zeros(n), where=graph.out_degrees > 0
+    )
+    bounds = np.linspace(0, n, min(GAUSS_SEIDEL_BLOCKS, n) + 1).astype(np.int64)
+
+    def sweep(ranks):
+        ranks = ranks.copy()
+        shares = ranks * share
+        dangling_rank = ranks[dangling].sum()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            first, last = links_in.offsets[start], links_in.offsets[end]
+            received = np.bincount(
+                links_in.sources[first:last] - start,
+                weights=shares[links_in.targets[first:last]],
+                minlength=end - start
+            )
+            block = (
+                (1 - damping_factor) / n +
+                damping_factor * (received + dangling_rank / n)
+            )
+            dangling_rank += (block - ranks[start:end])[dangling[start:end]].sum()
+            ranks[start:end] = block
+            shares[start:end] = block * share[start:end]
+        return ranks / ranks.sum()
+
+    return sweep
+
+
+def aitken_extrapolation(before, previous, ranks):
+    """
+    Return the Aitken delta-squared estimate of the limit of a sequence
+    of rank vectors from its last three terms, normalized to sum to 1.
+    Pages whose ranks are not changing at a steady rate keep `ranks`.
+    """
+    step = ranks - previous
+    curvature = step - (previous - before)
+    estimate = ranks.copy()
+    steady = np.abs(curvature) > 1e-300
+    estimate[steady] -= step[steady] ** 2 / curvature[steady]
+    return estimate / estimate.sum()
+
+
+def quadratic_extrapolation(oldest, before, previous, ranks):
+    """
+    Return the quadratic extrapolation (Kamvar et al., 2003) of the limit
+    of a sequence of rank vectors from its last four terms, normalized
+    to sum to 1.
+
+    The limit is assumed to be the combination of the last three terms
+    that cancels the two slowest-decaying parts of the error, found by
+    least squares.
+    """
+    differences = np.column_stack([before - oldest, previous - oldest])
+    (gamma1, gamma2), *_ = np.linalg.lstsq(
+        differences, -(ranks - oldest), rcond=None
+    )
+    estimate = (
+        (gamma1 + gamma2 + 1) * before + (gamma2 + 1) * previous + ranks
+    )
+    return estimate / estimate.sum()
+
+
+def update_ranks(graph, damping_factor, ranks, threshold):
+    """
+    Return the PageRank of each page of `graph`, starting from the
+    estimate `ranks` (such as the ranks before the graph last changed)
+    rather than from a uniform start.
+
+    One full sweep finds the residual, how far each page's rank is from
+    its PageRank equation. After that only large residuals are pushed
+    along the links of their pages, so unchanged parts of the graph are
+    left alone once their residuals are small. A residual left behind
+    can still move ranks by up to 1 / (1 - damping_factor) times its
+    size, so residuals are pushed until all are below `threshold` times
+    (1 - damping_factor), which is about as accurate as `power_iteration`
+    with the same `threshold`.
+    """
+    n = len(graph.pages)
+    dangling = graph.out_degrees == 0
+    threshold *= 1 - damping_factor
+    ranks = np.array(ranks, dtype=np.float64)
+    residuals = (
+        (1 - damping_factor) / n +
+        damping_factor * (graph.spread(ranks) + ranks[dangling].sum() / n) -
+        ranks
+    )
+    while True:
+        active = np.flatnonzero(np.abs(residuals) >= threshold)
+        if not len(active):
+            return ranks + residuals
+
+        # Once much of the graph is affected, a full sweep pushing every
+        # residual is cheaper than picking out the links to push along
+        if len(active) * DENSE_PUSH > n:
+            ranks += residuals
+            residuals = damping_factor * (
+                graph.spread(residuals) + residuals[dangling].sum() / n
+            )
+            continue
+        pushed = residuals[active]
+        ranks[active] += pushed
+        residuals[active] = 0
+
+        # Share each pushed residual between the page's links, or between
+        # every page for a page without links
+        degrees = graph.out_degrees[active]
+        linked = degrees > 0
+        residuals += damping_factor * pushed[~linked].sum() / n
+        degrees = degrees[linked]
+        # Positions in `targets` of every link of the pushed pages
+        starts = graph.offsets[active[linked]]
+        ends = np.cumsum(degrees)
+        links = (
+            np.arange(ends[-1] if len(ends) else 0) +
+            np.repeat(starts - (ends - degrees), degrees)
+        )
+        residuals += damping_factor * np.bincount(
+            graph.targets[links],
+            weights=np.repeat(pushed[linked] / degrees, degrees),
+            minlength=n
+        )
+
+
+def stream_pagerank(filename, damping_factor, threshold, norm="max",
+                    max_iterations=None, block_size=STREAM_BLOCK, log=None):
+    """
+    Return the PageRank of each page of the graph saved at `filename` by
+    `LinkGraph.save`, like `power_iteration` with the "power" method,
+    but without loading the graph into memory.
+
+    Each sweep streams the memory-mapped offsets and targets from disk in
+    blocks of pages with about `block_size` links between them, so only
+    the old and new rank vectors and one block are ever in memory. Each
+    block adds its links' shares into the new ranks in place, so a sweep
+    costs time in proportion to the links, however many blocks there
+    are. The entries passed to `log` also record the bytes read from the
+    file and the time spent reading them.
+    """
+    arrays = load_arrays(filename)
+    offsets, targets = arrays["offsets"], arrays["targets"]
+    n = len(offsets) - 1
+
+    # Pages starting each block, found by binary search so the offsets
+    # are never read in full here. Blocks also hold at most `block_size`
+    # pages, in case many pages in a row have no links
+    bounds = np.unique(np.concatenate([
+        np.arange(0, n, block_size),
+        np.searchsorted(
+            offsets, np.arange(0, int(offsets[-1]), block_size), side="right"
+        ) - 1,
+        [n],
+    ]))
+
+    received = np.empty(n)
+    totals = {"bytes": 0, "read_seconds": 0.0}
+
+    def sweep(ranks, iteration):
+        nonlocal received
+        received.fill(0)
+        dangling_rank = 0.0
+        read = 0
+        read_seconds = 0.0
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            reading = time.perf_counter()
+            block_offsets = np.array(offsets[start:end + 1])
+            block_targets = np.array(targets[block_offsets[0]:block_offsets[-1]])
+            read_seconds += time.perf_counter() - reading
+            read += block_offsets.nbytes + block_targets.nbytes
+
+            degrees = np.diff(block_offsets)
+            block_ranks = ranks[start:end]
+            dangling_rank += block_ranks[degrees == 0].sum()
+            shares = np.divide(
+                block_ranks, degrees,
+                out=np.zeros_like(block_ranks), where=degrees > 0
+            )
+            np.add.at(received, block_targets, np.repeat(shares, degrees))
+
+        # The new ranks take the place of what pages received, and the old
+        # ranks that of the change, which is then the next sweep's buffer
+        received *= damping_factor
+        received += (1 - damping_factor + damping_factor * dangling_rank) / n
+        np.subtract(ranks, received, out=ranks)
+        np.abs(ranks, out=ranks)
+        residual = float(ranks.max() if norm == "max" else ranks.sum())
+        ranks, received = received, ranks
+        totals["bytes"] += read
+        totals["read_seconds"] += read_seconds
+        return ranks, {
+            "method": "stream",
+            "norm": norm,
+            "residual": residual,
+            "extrapolated": False,
+            "bytes": read,
+            "read_seconds": read_seconds,
+        }
+
+    return converge(
+        sweep, np.full(n, 1 / n), threshold, max_iterations, log, totals
+    )
+
+
+def random_walk(graph, damping_factor, n, rng):
+    """
+    Return how many of `n` samples of random surfers on `graph` land on
+    each page, as an array, drawing random numbers from the NumPy
+    Generator `rng`.
+
+    Up to WALKERS surfers start on random pages and move in lockstep
+    (see `surf`), and are counted once they are past BURN_IN steps.
+    """
+    pages = len(graph.pages)
+    walkers = max(1, min(WALKERS, n))
+    positions = rng.integers(pages, size=walkers)
+    for _ in range(BURN_IN):
+        positions = surf(graph, positions, damping_factor, rng)
+
+    counts = np.zeros(pages, dtype=np.int64)
+    buffer = np.empty(BUFFER_SIZE + walkers, dtype=positions.dtype)
+    filled = 0
+    while n > 0:
+        recorded = min(walkers, n)
+        buffer[filled:filled + recorded] = positions[:recorded]
+        filled += recorded
+        n -= recorded
+        if filled >= BUFFER_SIZE or n == 0:
+            counts += np.bincount(buffer[:filled], minlength=pages)
+            filled = 0
+        positions = surf(graph, positions, damping_factor, rng)
+    return counts
+
+
+def surf(graph, positions, damping_factor, rng):
+    """
+    Move each surfer at the page indices in `positions` one step.
+
+    One uniform draw per surfer decides whether it follows a link, and
+    another picks the link, or the page to move to when it teleports
+    or is on a page without links.
+    """
+    picks = rng.random(len(positions))
+    degrees = graph.out_degrees[positions]
+    follow = np.flatnonzero(
+        (rng.random(len(positions)) < damping_factor) & (degrees > 0)
+    )
+    new_positions = (picks * len(graph.pages)).astype(positions.dtype)
+    new_positions[follow] = graph.targets[
+        graph.offsets[positions[follow]] +
+        (picks[follow] * degrees[follow]).astype(np.int64)
+    ]
+    return new_positions
+
+
+def write_arrays(filename, arrays):
+    """
+    Write the named NumPy `arrays` to `filename` after a JSON header
+    recording their layout, each starting at a multiple of 8 bytes so
+    they can be memory-mapped.
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = [offset, len(array), array.dtype.str]
+        offset += array.nbytes + padding(array.nbytes)
+    header = json.dumps({
+        "version": LINKS_VERSION,
+        "byteorder": sys.byteorder,
+        "arrays": layout,
+    }).encode("utf-8")
+    header += b" " * padding(len(LINKS_MAGIC) + 4 + len(header))
+
+    # Write to a temporary file first so readers never see a partial file
+    temporary = f"{filename}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(LINKS_MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for array in arrays.values():
+            f.write(array.tobytes())
+            f.write(bytes(padding(array.nbytes)))
+    os.replace(temporary, filename)
+
+
+def load_arrays(filename):
+    """
+    Return a dictionary of the arrays in a file written by `write_arrays`,
+    memory-mapped read-only.
+
+    Raises ValueError if `filename` is not such a file, or was written
+    by another version or on a platform with another byte order.
+    """
+    with open(filename, "rb") as f:
+        prefix = f.read(len(LINKS_MAGIC) + 4)
+        if len(prefix) < len(LINKS_MAGIC) + 4 or not prefix.startswith(LINKS_MAGIC):
+            raise ValueError(f"{filename} is not a link graph file")
+        length, = struct.unpack("<I", prefix[len(LINKS_MAGIC):])
+        try:
+            header = json.loads(f.read(length))
+        except ValueError:
+            raise ValueError(f"{filename} has a corrupt header")
+    if header.get("version") != LINKS_VERSION:
+        raise ValueError(f"{filename} was written by another version")
+    if header.get("byteorder") != sys.byteorder:
+        raise ValueError(f"{filename} was written with another byte order")
+
+    start = len(prefix) + length
+    arrays = {}
+    for name, (offset, count, dtype) in header["arrays"].items():
+        if count:
+            arrays[name] = np.memmap(
+                filename, dtype=dtype, mode="r",
+                offset=start + offset, shape=count
+            )
+        else:
+            arrays[name] = np.zeros(0, dtype=dtype)
+    return arrays
+
+
+def pack_strings(strings):
+    """
+    Return `strings` joined into a byte array, for `write_arrays`.
+    """
+    return np.frombuffer("\0".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def unpack_strings(array):
+    """
+    Return the list of strings packed by `pack_strings` into `array`.
+    """
+    joined = array.tobytes().decode("utf-8")
+    return joined.split("\0") if joined else []
+
+
+def iter_strings(array, chunk_size=BUFFER_SIZE):
+    """
+    Yield the strings packed by `pack_strings` into `array` in turn,
+    decoding `chunk_size` bytes at a time rather than the whole array.
+    """
+    rest = b""
+    for start in range(0, len(array), chunk_size):
+        parts = (rest + array[start:start + chunk_size].tobytes()).split(b"\0")
+        rest = parts.pop()
+        for part in parts:
+            yield part.decode("utf-8")
+    if len(array):
+        yield rest.decode("utf-8")
+
+
+def padding(length, alignment=8):
+    """
+    Return the number of bytes needed to align `length` to `alignment`.
+    """
+    return -length % alignment
@@ -1,72 +1,481 @@
+import argparse
+import functools
+import json
 import os
-import random
 import re
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from linkgraph import (
+    METHODS, NORMS, LinkGraph, iter_strings, load_arrays, pack_strings,
+    personalized_power_iteration, power_iteration, random_walk,
+    stream_pagerank, unpack_strings, update_ranks
+)
 
 DAMPING = 0.85
 SAMPLES = 10000
 
+# Iteration stops once no page's rank changes by this much in a sweep
+# (by default; see --tolerance and --norm)
+THRESHOLD = 0.001
+
+# Links in an HTML page
+LINK = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
+# Characters of an HTML file read at a time
+READ_SIZE = 1 << 16
+
+# Longest link tag that is still found if it straddles two reads, as
+# each read is searched together with this much of the previous one
+MAX_TAG = 4096
+
+# Files handed to a crawler process at a time, and the threads each
+# crawler uses to read them
+CRAWL_BATCH = 256
+CRAWL_THREADS = 8
+
+# Names of every page in the corpus being crawled, set in each crawler
+corpus_pages = None
+
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
-    print(f"PageRank Results from Sampling (n = {SAMPLES})")
+    parser = argparse.ArgumentParser(
+        description="Rank the pages of a corpus by sampling and by iteration."
+    )
+    parser.add_argument("corpus",
+                        help="directory of HTML pages, or a link graph file "
+                             "saved with --save-links")
+    parser.add_argument("--samples", type=int, default=SAMPLES,
+                        help=f"pages to sample (default: {SAMPLES})")
+    parser.add_argument("--seed", type=int,
+                        help="seed for reproducible sampling")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes crawling the corpus (default: 1)")
+    parser.add_argument("--save-links", metavar="FILE",
+                        help="save the crawled link graph to FILE")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="only re-read the files changed since the crawl "
+                             "cached in FILE, and update its ranks")
+    parser.add_argument("--tolerance", type=float, default=THRESHOLD,
+                        help="stop iterating once the ranks change by less "
+                             f"than this in a sweep (default: {THRESHOLD})")
+    parser.add_argument("--norm", choices=NORMS, default="max",
+                        help="measure the change as the largest change to "
+                             "any page (max) or the total change (l1)")
+    parser.add_argument("--max-iterations", type=int,
+                        help="stop after this many sweeps even if the ranks "
+                             "have not converged")
+    parser.add_argument("--method", choices=METHODS, default="power",
+                        help="how each sweep updates the ranks "
+                             "(default: power)")
+    parser.add_argument("--log", metavar="FILE",
+                        help="write the residual and time of each sweep to "
+                             "FILE as JSON lines")
+    parser.add_argument("--stream", action="store_true",
+                        help="rank a link graph file without loading it, "
+                             "streaming its links from disk each sweep")
+    parser.add_argument("--topic", action="append", default=[],
+                        metavar="NAME=PAGE[,PAGE...]",
+                        help="also rank the pages for surfers who teleport "
+                             "only to the given pages (may be repeated)")
+    args = parser.parse_args()
+    if args.max_iterations is not None and args.max_iterations < 1:
+        sys.exit("--max-iterations must be positive")
+    topics = {}
+    for topic in args.topic:
+        name, _, pages = topic.partition("=")
+        if not name or not pages:
+            sys.exit(f"--topic must look like NAME=PAGE[,PAGE...], not {topic}")
+        topics[name] = pages.split(",")
+    if args.stream:
+        if os.path.isdir(args.corpus):
+            sys.exit("--stream needs a link graph file saved with --save-links")
+        if args.cache or args.method != "power" or topics:
+            sys.exit("--stream only makes power iteration sweeps")
+        rank_streamed(args)
+        return
+    if args.cache and (args.norm != "max" or args.method != "power" or
+                       args.max_iterations is not None or args.log):
+        sys.exit("--cache updates ranks by residual push, which only "
+                 "takes --tolerance")
+
+    previous = None
+    if args.cache:
+        if not os.path.isdir(args.corpus):
+            sys.exit("--cache needs a directory of HTML pages")
+        start = time.perf_counter()
+        previous = CrawlCache.load(args.cache)
+        crawled = CrawlCache.crawl(args.corpus, previous, args.workers)
+        corpus = crawled.corpus
+        print(f"Crawled {len(corpus)} pages in "
+              f"{time.perf_counter() - start:.3f}s "
+              f"({len(crawled.changes['added'])} added, "
+              f"{len(crawled.changes['removed'])} removed, "
+              f"{len(crawled.changes['changed'])} changed)")
+        if args.save_links:
+            LinkGraph.from_corpus(corpus).save(args.save_links)
+    elif os.path.isdir(args.corpus):
+        start = time.perf_counter()
+        corpus = crawl(args.corpus, args.workers)
+        print(f"Crawled {len(corpus)} pages in "
+              f"{time.perf_counter() - start:.3f}s")
+        if args.save_links:
+            LinkGraph.from_corpus(corpus).save(args.save_links)
+    else:
+        try:
+            corpus = LinkGraph.load(args.corpus)
+        except (OSError, ValueError) as e:
+            sys.exit(f"Could not load {args.corpus}: {e}")
+    start = time.perf_counter()
+    ranks = sample_pagerank(corpus, DAMPING, args.samples, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"PageRank Results from Sampling (n = {args.samples})")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING)
-    print(f"PageRank Results from Iteration")
+    rate = args.samples / elapsed if elapsed else float("inf")
+    print(f"Sampled in {elapsed:.3f}s ({rate:,.0f} samples/s)")
+    start = time.perf_counter()
+    if previous is None:
+        ranks, entries = run_logged(args.log, lambda log: iterate_pagerank(
+            corpus, DAMPING, args.tolerance, args.norm,
+            args.max_iterations, args.method, log
+        ))
+        summary = entries[-1]
+    else:
+        ranks = update_pagerank(
+            corpus, DAMPING, previous.ranks, args.tolerance
+        )
+    elapsed = time.perf_counter() - start
+    print("PageRank Results from Iteration")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
+    if previous is not None:
+        print(f"Converged from cached ranks in {elapsed:.3f}s")
+    elif summary["converged"]:
+        print(f"Converged in {summary['iterations']} iterations "
+              f"({elapsed:.3f}s, {args.method})")
+    else:
+        print(f"Stopped after {summary['iterations']} iterations without "
+              f"converging (change {summary['residual']:.2e}, "
+              f"{elapsed:.3f}s, {args.method})")
+    if args.cache:
+        crawled.ranks = ranks
+        crawled.save(args.cache)
+
+    if topics:
+        start = time.perf_counter()
+        try:
+            topic_ranks = personalized_pagerank(
+                corpus, DAMPING, topics, args.tolerance, args.norm,
+                args.max_iterations
+            )
+        except ValueError as e:
+            sys.exit(e)
+        elapsed = time.perf_counter() - start
+        for name, ranks in topic_ranks.items():
+            print(f"PageRank Results for Topic {name}")
+            for page in sorted(ranks):
+                print(f"  {page}: {ranks[page]:.4f}")
+        print(f"Ranked {len(topics)} topics in {elapsed:.3f}s")
+
+
+def rank_streamed(args):
+    """
+    Rank the pages of the link graph file `args.corpus` by streaming it
+    (see `stream_pagerank`), and print the ranks and how fast the file
+    was read. There is no sampling, as random surfers would need the
+    whole graph in memory.
+    """
+    try:
+        ranks, entries = run_logged(args.log, lambda log: stream_pagerank(
+            args.corpus, DAMPING, args.tolerance, args.norm,
+            args.max_iterations, log=log
+        ))
+        pages = load_arrays(args.corpus)["pages"]
+    except (OSError, ValueError) as e:
+        sys.exit(f"Could not load {args.corpus}: {e}")
+    summary = entries[-1]
+
+    print("PageRank Results from Iteration")
+    for page, rank in zip(iter_strings(pages), ranks):
+        print(f"  {page}: {rank:.4f}")
+    if summary["converged"]:
+        print(f"Converged in {summary['iterations']} iterations "
+              f"({summary['seconds']:.3f}s, streamed)")
+    else:
+        print(f"Stopped after {summary['iterations']} iterations without "
+              f"converging (change {summary['residual']:.2e}, "
+              f"{summary['seconds']:.3f}s, streamed)")
+    megabytes = summary["bytes"] / 1e6
+    read_seconds = summary["read_seconds"]
+    rate = megabytes / read_seconds if read_seconds else float("inf")
+    print(f"Streamed {megabytes:,.1f} MB in {read_seconds:.3f}s "
+          f"({rate:,.0f} MB/s)")
 
 
-def crawl(directory):
+def run_logged(filename, rank):
+    """
+    Return `rank(log)` and the list of entries it passed to `log`, which
+    also writes each entry to `filename`, if given, as a JSON line.
+    """
+    entries = []
+    log_file = open(filename, "w") if filename else None
+    try:
+        def log(entry):
+            entries.append(entry)
+            if log_file:
+                log_file.write(json.dumps(entry) + "\n")
+        return rank(log), entries
+    finally:
+        if log_file:
+            log_file.close()
+
+
+class CrawlCache():
+    """
+    A crawl of a directory saved with the ranks computed from it, so the
+    next crawl only has to read the files that changed.
+
+    `fingerprints` maps each page to the size and modification time of
+    its file, and `missing` maps each page to its links to pages outside
+    the corpus, which become links again if those pages are added.
+    """
+
+    def __init__(self, corpus, missing, fingerprints, ranks=None, changes=None):
+        self.corpus = corpus
+        self.missing = missing
+        self.fingerprints = fingerprints
+        self.ranks = ranks
+
+        # Sets of the "added", "removed" and "changed" pages since the
+        # crawl this one was updated from
+        self.changes = changes
+
+    @classmethod
+    def crawl(cls, directory, previous=None, workers=1):
+        """
+        Crawl `directory` like `crawl`, reusing the links of the pages
+        whose files have the same fingerprint as in the CrawlCache
+        `previous`.
+        """
+        filenames = html_files(directory)
+        fingerprints = {
+            filename: file_fingerprint(directory, filename)
+            for filename in filenames
+        }
+        previous = previous or cls({}, {}, {})
+
+        names = set(filenames)
+        corpus, missing = {}, {}
+        for filename in filenames:
+            if previous.fingerprints.get(filename) != fingerprints[filename]:
+                continue
+            links = previous.corpus[filename] | previous.missing[filename]
+            corpus[filename] = links & names
+            missing[filename] = links - names
+
+        stale = [filename for filename in filenames if filename not in corpus]
+        for filename, links, outside in crawl_pages(
+            directory, stale, filenames, workers
+        ):
+            corpus[filename] = links
+            missing[filename] = outside
+
+        changes = {
+            "added": names - previous.fingerprints.keys(),
+            "removed": previous.fingerprints.keys() - names,
+        }
+        changes["changed"] = set(stale) - changes["added"]
+        return cls(corpus, missing, fingerprints, changes=changes)
+
+    def save(self, filename):
+        """
+        Write the crawl and its ranks to `filename` as a link graph file
+        (see `LinkGraph.save`) with extra arrays.
+        """
+        graph = LinkGraph.from_corpus(self.corpus)
+        missing = [sorted(self.missing[page]) for page in graph.pages]
+        graph.save(filename, extra={
+            "ranks": np.array([self.ranks[page] for page in graph.pages]),
+            "sizes": np.array(
+                [self.fingerprints[page][0] for page in graph.pages],
+                dtype=np.int64
+            ),
+            "mtimes": np.array(
+                [self.fingerprints[page][1] for page in graph.pages],
+                dtype=np.int64
+            ),
+            "missing_offsets": np.cumsum(
+                [0] + [len(links) for links in missing], dtype=np.int64
+            ),
+            "missing": pack_strings(
+                [link for links in missing for link in links]
+            ),
+        })
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Load a crawl written by `save`, or return None if `filename` is
+        missing or is not such a file.
+        """
+        try:
+            graph = LinkGraph.load(filename)
+            arrays = load_arrays(filename)
+            ranks = arrays["ranks"].tolist()
+            sizes = arrays["sizes"].tolist()
+            mtimes = arrays["mtimes"].tolist()
+            missing_offsets = arrays["missing_offsets"].tolist()
+            missing_links = unpack_strings(arrays["missing"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+        offsets = graph.offsets.tolist()
+        targets = graph.targets.tolist()
+        corpus, missing, fingerprints = {}, {}, {}
+        for i, page in enumerate(graph.pages):
+            corpus[page] = {
+                graph.pages[target]
+                for target in targets[offsets[i]:offsets[i + 1]]
+            }
+            missing[page] = set(
+                missing_links[missing_offsets[i]:missing_offsets[i + 1]]
+            )
+            fingerprints[page] = (sizes[i], mtimes[i])
+        return cls(corpus, missing, fingerprints, dict(zip(graph.pages, ranks)))
+
+
+def crawl(directory, workers=1):
     """
     Parse a directory of HTML pages and check for links to other pages.
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
+
+    Files are streamed rather than read whole, on a pool of threads.
+    With more than one of `workers`, the files are split into batches
+    between that many processes, which each extract links on their own
+    threads. Links outside the corpus are dropped as they are found.
     """
-    pages = dict()
-
-    # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
-
-    # Only include links to other pages in the corpus
-    for filename in pages:
-        pages[filename] = set(
-            link for link in pages[filename]
-            if link in pages
+    filenames = html_files(directory)
+    return {
+        filename: links
+        for filename, links, _ in crawl_pages(
+            directory, filenames, filenames, workers
         )
+    }
+
 
-    return pages
+def html_files(directory):
+    """
+    Return the names of the HTML files in `directory`.
+    """
+    return [
+        filename for filename in os.listdir(directory)
+        if filename.endswith(".html")
+    ]
+
+
+def file_fingerprint(directory, filename):
+    """
+    Return the size and modification time of a file in `directory`.
+    """
+    stat = os.stat(os.path.join(directory, filename))
+    return stat.st_size, stat.st_mtime_ns
+
+
+def crawl_pages(directory, filenames, corpus, workers=1):
+    """
+    Return (filename, links, outside) triples for `filenames` in
+    `directory`, splitting the links of each page between those to pages
+    named in `corpus` and those `outside` it (see `crawl`).
+    """
+    crawl_batch = functools.partial(crawl_files, directory)
+    if workers > 1:
+        batches = [
+            filenames[i:i + CRAWL_BATCH]
+            for i in range(0, len(filenames), CRAWL_BATCH)
+        ]
+        with ProcessPoolExecutor(
+            workers, initializer=set_corpus_pages, initargs=(corpus,)
+        ) as pool:
+            return [
+                triple for batch in pool.map(crawl_batch, batches)
+                for triple in batch
+            ]
+
+    set_corpus_pages(corpus)
+    return crawl_batch(filenames)
+
+
+def set_corpus_pages(filenames):
+    """
+    Record the names of the pages in the corpus being crawled.
+    """
+    global corpus_pages
+    corpus_pages = set(filenames)
+
+
+def crawl_files(directory, filenames):
+    """
+    Return (filename, links, outside) triples for `filenames` in
+    `directory`, splitting the files between CRAWL_THREADS threads.
+    """
+    def crawl_share(share):
+        triples = []
+        for filename in share:
+            links = page_links(directory, filename)
+            triples.append((
+                filename, links & corpus_pages, links - corpus_pages
+            ))
+        return triples
+
+    shares = [filenames[i::CRAWL_THREADS] for i in range(CRAWL_THREADS)]
+    with ThreadPoolExecutor(CRAWL_THREADS) as threads:
+        return [pair for pairs in threads.map(crawl_share, shares) for pair in pairs]
 
 
-def transition_model(corpus, page, damping_factor):
+def page_links(directory, filename):
+    """
+    Return the set of other pages linked to by the HTML file `filename`
+    in `directory`, reading it READ_SIZE characters at a time.
+    """
+    links = set()
+    previous = ""
+    with open(os.path.join(directory, filename)) as f:
+        while chunk := f.read(READ_SIZE):
+            text = previous + chunk
+            links.update(LINK.findall(text))
+            previous = text[-MAX_TAG:]
+    links.discard(filename)
+    return links
+
+
+def transition_model(corpus, page, damping_factor, teleport=None):
     """
     Return a probability distribution over which page to visit next,
     given a current page.
 
     With probability `damping_factor`, choose a link at random
     linked to by `page`. With probability `1 - damping_factor`, choose
-    a link at random chosen from all pages in the corpus.
+    a link at random chosen from all pages in the corpus, or from the
+    distribution `teleport` mapping pages to probabilities, if given.
+    A page without links is treated as linking to every page.
     """
     
     distribution = dict()
     total_pages = len(corpus)
     links = corpus[page]
 
-    if links:
+    if links or teleport:
         for p in corpus:
-            distribution[p] = (1 - damping_factor) / total_pages
-        for link in links:
-            distribution[link] += damping_factor / len(links)
+            distribution[p] = (1 - damping_factor) * (
+                teleport.get(p, 0) if teleport else 1 / total_pages
+            )
+        for link in links or corpus:
+            distribution[link] += damping_factor / len(links or corpus)
     else:
         for p in corpus:
             distribution[p] = 1 / total_pages
@@ -74,7 +483,7 @@ def transition_model(corpus, page, damping_factor):
     return distribution
 
 
-def sample_pagerank(corpus, damping_factor, n):
+def sample_pagerank(corpus, damping_factor, n, seed=None):
     """
     Return PageRank values for each page by sampling `n` pages
     according to transition model, starting with a page at random.
@@ -82,27 +491,19 @@ def sample_pagerank(corpus, damping_factor, n):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
-    """
-    pagerank = {page: 0 for page in corpus}
-    pages = list(corpus.keys())
-    current_page = random.choice(pages)
 
-    for _ in range(n):
-        pagerank[current_page] += 1
-        model = transition_model(corpus, current_page, damping_factor)
-        current_page = random.choices(
-            population=list(model.keys()),
-            weights=list(model.values()),
-            k=1
-        )[0]
-
-    for page in pagerank:
-        pagerank[page] /= n
-
-    return pagerank
+    Many random surfers are simulated together on a LinkGraph, so each
+    sample costs a few array operations instead of building a full
+    transition model. Passing the same `seed` gives the same results.
+    `corpus` may also be a LinkGraph.
+    """
+    graph = link_graph(corpus)
+    counts = random_walk(graph, damping_factor, n, np.random.default_rng(seed))
+    return dict(zip(graph.pages, (counts / n).tolist()))
 
 
-def iterate_pagerank(corpus, damping_factor):
+def iterate_pagerank(corpus, damping_factor, threshold=THRESHOLD, norm="max",
+                     max_iterations=None, method="power", log=None):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
@@ -110,29 +511,84 @@ def iterate_pagerank(corpus, damping_factor):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    The corpus is converted to a sparse LinkGraph once (unless it is
+    one already), so each sweep costs time proportional to the number of
+    pages and links. `threshold`, `norm`, `max_iterations`, `method`
+    and `log` are passed on to `power_iteration`.
+    """
+    graph = link_graph(corpus)
+    ranks = power_iteration(
+        graph, damping_factor, threshold, norm, max_iterations, method, log
+    )
+    return dict(zip(graph.pages, ranks.tolist()))
+
+
+def update_pagerank(corpus, damping_factor, previous, threshold=THRESHOLD):
+    """
+    Return PageRank values for each page like `iterate_pagerank`, but
+    starting from `previous`, the PageRank values of an earlier version
+    of the corpus, so only the parts that changed need re-converging.
+    Pages new to the corpus start from the average rank.
+    """
+    graph = link_graph(corpus)
+    ranks = np.array([
+        previous.get(page, 1 / len(graph.pages)) for page in graph.pages
+    ])
+    ranks = update_ranks(graph, damping_factor, ranks / ranks.sum(), threshold)
+    return dict(zip(graph.pages, ranks.tolist()))
+
+
+def personalized_pagerank(corpus, damping_factor, teleports,
+                          threshold=THRESHOLD, norm="max", max_iterations=None):
     """
-    N = len(corpus)
-    pagerank = {page: 1 / N for page in corpus}
-    converged = False
+    Return PageRank values for each page like `iterate_pagerank`, once
+    for each topic in `teleports`, where surfers teleport only to the
+    topic's pages.
+
+    `teleports` maps each topic to a dictionary mapping pages to how
+    likely surfers are to teleport to them, or to a list of pages to
+    teleport to evenly. Return a dictionary mapping each topic to its
+    PageRank values.
 
-    while not converged:
-        new_ranks = dict()
+    Every topic is ranked on the same LinkGraph, built once (see
+    `personalized_power_iteration`), rather than converting the corpus
+    once per topic.
 
-        for page in corpus:
-            total = 0
-            for possible_page in corpus:
-                links = corpus[possible_page]
-                if not links:
-                    links = set(corpus.keys())
-                if page in links:
-                    total += pagerank[possible_page] / len(links)
-            new_rank = (1 - damping_factor) / N + damping_factor * total
-            new_ranks[page] = new_rank
+    Raises ValueError if a topic has a page not in the corpus, or no
+    pages to teleport to.
+    """
+    graph = link_graph(corpus)
+    index = {page: i for i, page in enumerate(graph.pages)}
+    matrix = np.zeros((len(graph.pages), len(teleports)))
+    for column, (topic, weights) in enumerate(teleports.items()):
+        if not isinstance(weights, dict):
+            weights = dict.fromkeys(weights, 1)
+        for page, weight in weights.items():
+            if page not in index:
+                raise ValueError(
+                    f"Topic {topic} has a page not in the corpus: {page}"
+                )
+            matrix[index[page], column] = weight
+        if not matrix[:, column].any():
+            raise ValueError(f"Topic {topic} has no pages to teleport to")
+    ranks = personalized_power_iteration(
+        graph, damping_factor, matrix, threshold, norm, max_iterations
+    )
+    return {
+        topic: dict(zip(graph.pages, ranks[:, column].tolist()))
+        for column, topic in enumerate(teleports)
+    }
 
-        converged = all(abs(new_ranks[page] - pagerank[page]) < 0.001 for page in pagerank)
-        pagerank = new_ranks
 
-    return pagerank
+def link_graph(corpus):
+    """
+    Return `corpus` as a LinkGraph, converting it if it is a dictionary
+    as returned by `crawl`.
+    """
+    if isinstance(corpus, LinkGraph):
+        return corpus
+    return LinkGraph.from_corpus(corpus)
 
 
 if __name__ == "__main__":